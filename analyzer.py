@@ -0,0 +1,309 @@
+#!/usr/bin/python3
+"""Статический анализ стоимости программы в тактах без симуляции.
+
+Строит граф потока управления по машинному коду транслятора, считает
+стоимость базовых блоков и циклов по таблице тактов из README и даёт
+верхнюю оценку числа тактов для точки входа программы и для обработчика
+прерывания. Для циклов границу (число выполнений заголовка) задаёт
+пользователь.
+"""
+
+import sys
+
+from isa import (
+    INITIALIZATION_TICKS,
+    INTERRUPTION_ENTRY_TICKS,
+    Opcode,
+    collect_labels,
+    instruction_ticks,
+    read_code,
+)
+
+
+class BasicBlock:
+    start: int = None
+    end: int = None
+    cost: int = None
+    successors: list = None
+
+    def __init__(self, start: int, end: int, cost: int, successors: list):
+        self.start = start
+        self.end = end
+        self.cost = cost
+        self.successors = successors
+
+
+class Loop:
+    header: int = None
+    blocks: list = None
+    iteration_cost: int = None
+
+    def __init__(self, header: int, blocks: list, iteration_cost: int):
+        self.header = header
+        self.blocks = blocks
+        self.iteration_cost = iteration_cost
+
+
+class ControlFlowGraph:
+    code: list = None
+    blocks: dict = None
+    labels: dict = None
+
+    def __init__(self, code: list):
+        self.code = code
+        self.labels = collect_labels(code)
+        self.blocks = {}
+
+    def name(self, address: int) -> str:
+        """Имя адреса для отчёта: метка, если она известна"""
+        if address in self.labels:
+            return f"{self.labels[address]} ({address})"
+        return str(address)
+
+
+def instruction_successors(code: list, address: int) -> list:
+    """Адреса, на которые может перейти управление после инструкции"""
+    instr = code[address]
+    opcode = Opcode(instr["opcode"])
+    if opcode in (Opcode.HALT, Opcode.IRET):
+        return []
+    if opcode == Opcode.JMP:
+        return [instr["op"]]
+    if opcode in (Opcode.JZ, Opcode.JNZ):
+        return [address + 1, instr["op"]]
+    return [address + 1]
+
+
+def entry_points(code: list) -> dict:
+    """Точки входа: начало программы, точки входа ядер и обработчики прерываний"""
+    entries = {"start": code[0]["op"]}
+    entries.update((name, address) for name, address in code[-1].items() if isinstance(address, int))
+    return entries
+
+
+def find_leaders(code: list, entries) -> set:
+    """Адреса начала базовых блоков, достижимых из точек входа"""
+    leaders = set(entries)
+    visited = set()
+    stack = list(entries)
+    while stack:
+        address = stack.pop()
+        if address in visited:
+            continue
+        visited.add(address)
+        successors = instruction_successors(code, address)
+        if len(successors) != 1 or successors[0] != address + 1:
+            leaders.update(successors)
+        stack.extend(successors)
+    return leaders
+
+
+def build_cfg(code: list) -> ControlFlowGraph:
+    """Разбить достижимый код на базовые блоки"""
+    cfg = ControlFlowGraph(code)
+    leaders = find_leaders(code, entry_points(code).values())
+    for start in sorted(leaders):
+        address, cost = start, 0
+        while True:
+            assert "opcode" in code[address], f"Control flow reaches data cell {address}"
+            cost += instruction_ticks(code[address])
+            successors = instruction_successors(code, address)
+            if successors != [address + 1] or address + 1 in leaders:
+                break
+            address += 1
+        cfg.blocks[start] = BasicBlock(start, address, cost, successors)
+    return cfg
+
+
+def strongly_connected_components(nodes, edges) -> list:
+    """Компоненты сильной связности (алгоритм Тарьяна, без рекурсии).
+
+    Компоненты возвращаются в обратном топологическом порядке.
+    """
+    search = TarjanSearch(edges)
+    for root in nodes:
+        if root not in search.index:
+            search.visit(root)
+    return search.components
+
+
+class TarjanSearch:
+    edges = None
+    index: dict = None
+    lowlink: dict = None
+    stack: list = None
+    on_stack: set = None
+    components: list = None
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.index = {}
+        self.lowlink = {}
+        self.stack = []
+        self.on_stack = set()
+        self.components = []
+
+    def push(self, node) -> tuple:
+        self.index[node] = self.lowlink[node] = len(self.index)
+        self.stack.append(node)
+        self.on_stack.add(node)
+        return node, iter(self.edges(node))
+
+    def visit(self, root) -> None:
+        work = [self.push(root)]
+        while work:
+            node, successors = work[-1]
+            for succ in successors:
+                if succ not in self.index:
+                    work.append(self.push(succ))
+                    break
+                if succ in self.on_stack:
+                    self.lowlink[node] = min(self.lowlink[node], self.index[succ])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    self.lowlink[parent] = min(self.lowlink[parent], self.lowlink[node])
+                if self.lowlink[node] == self.index[node]:
+                    self.components.append(self.pop_component(node))
+
+    def pop_component(self, root) -> frozenset:
+        component = set()
+        while True:
+            node = self.stack.pop()
+            self.on_stack.discard(node)
+            component.add(node)
+            if node == root:
+                return frozenset(component)
+
+
+class WorstCaseEstimator:
+    """Верхняя оценка тактов по графу с известными границами циклов.
+
+    Цикл -- компонента сильной связности с единственным входом (заголовком).
+    Его стоимость -- граница, умноженная на самый дорогой путь тела цикла от
+    заголовка, в котором рёбра обратно в заголовок отброшены. Вложенные
+    циклы обрабатываются тем же способом рекурсивно.
+    """
+
+    cfg: ControlFlowGraph = None
+    bounds: dict = None
+    loops: list = None
+
+    def __init__(self, cfg: ControlFlowGraph, bounds: dict):
+        self.cfg = cfg
+        self.bounds = bounds
+        self.loops = []
+
+    def estimate(self, entry: int) -> int:
+        return self.region_cost(self.reachable(entry), entry)
+
+    def reachable(self, entry: int) -> frozenset:
+        nodes, stack = set(), [entry]
+        while stack:
+            node = stack.pop()
+            if node not in nodes:
+                nodes.add(node)
+                stack.extend(self.cfg.blocks[node].successors)
+        return frozenset(nodes)
+
+    def region_cost(self, nodes: frozenset, entry: int) -> int:
+        """Самый дорогой путь от `entry` внутри `nodes` без рёбер в `entry`"""
+
+        def edges(node):
+            return [succ for succ in self.cfg.blocks[node].successors if succ in nodes and succ != entry]
+
+        components = strongly_connected_components([entry, *sorted(nodes)], edges)
+        owner = {node: component for component in components for node in component}
+        headers = self.component_headers(components, owner, edges, entry)
+        path_cost = {}
+        for component in components:
+            successors = {owner[succ] for node in component for succ in edges(node)} - {component}
+            own = self.component_cost(component, headers[component], edges)
+            path_cost[component] = own + max((path_cost[succ] for succ in successors), default=0)
+        return path_cost[owner[entry]]
+
+    @staticmethod
+    def component_headers(components, owner, edges, entry) -> dict:
+        headers = {owner[entry]: {entry}}
+        for component in components:
+            for node in component:
+                for succ in edges(node):
+                    if owner[succ] is not component:
+                        headers.setdefault(owner[succ], set()).add(succ)
+        for component, entries in headers.items():
+            if len(entries) != 1:
+                raise IrreducibleLoopError(sorted(entries))
+        return {component: next(iter(entries)) for component, entries in headers.items()}
+
+    def component_cost(self, component: frozenset, header: int, edges) -> int:
+        if len(component) == 1 and header not in edges(header):
+            return self.cfg.blocks[header].cost
+        iteration_cost = self.region_cost(component, header)
+        self.loops.append(Loop(header, sorted(component), iteration_cost))
+        return self.loop_bound(header) * iteration_cost
+
+    def loop_bound(self, header: int) -> int:
+        for key in (header, self.cfg.labels.get(header)):
+            if key in self.bounds:
+                return self.bounds[key]
+        raise UnboundedLoopError(self.cfg.name(header))
+
+
+def analyze(code: list, bounds: dict) -> str:
+    """Сформировать текстовый отчёт: блоки, циклы и оценки для точек входа"""
+    cfg = build_cfg(code)
+    report = ["basic blocks:"]
+    for block in cfg.blocks.values():
+        successors = ", ".join(cfg.name(succ) for succ in block.successors) or "-"
+        report.append(f"  {cfg.name(block.start)}..{block.end}: {block.cost} ticks -> {successors}")
+
+    loops, estimates = {}, []
+    for name, entry in entry_points(code).items():
+        estimator = WorstCaseEstimator(cfg, bounds)
+        try:
+            overhead = INTERRUPTION_ENTRY_TICKS if name.startswith("int") else INITIALIZATION_TICKS
+            estimates.append(f"  {name}: {overhead + estimator.estimate(entry)} ticks")
+        except AnalysisError as e:
+            estimates.append(f"  {name}: unknown ({e})")
+        loops.update((loop.header, loop) for loop in estimator.loops)
+
+    report.append("loops:")
+    for loop in loops.values():
+        blocks = ", ".join(cfg.name(start) for start in loop.blocks)
+        report.append(f"  {cfg.name(loop.header)}: {loop.iteration_cost} ticks per iteration [{blocks}]")
+    report.append("worst case:")
+    return "\n".join(report + estimates)
+
+
+def parse_bounds(args: list) -> dict:
+    """Границы циклов в виде `метка=N` или `адрес=N`"""
+    bounds = {}
+    for arg in args:
+        key, value = arg.split("=", 1)
+        bounds[int(key) if key.isdigit() else key] = int(value)
+    return bounds
+
+
+def main(code_file: str, bound_args: list):
+    code = read_code(code_file)
+    print(analyze(code, parse_bounds(bound_args)))
+
+
+class AnalysisError(ValueError):
+    pass
+
+
+class UnboundedLoopError(AnalysisError):
+    def __init__(self, header):
+        super().__init__(f"no iteration bound for loop at {header}")
+
+
+class IrreducibleLoopError(AnalysisError):
+    def __init__(self, entries):
+        super().__init__(f"loop has several entries {entries}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 2, "Wrong arguments: analyzer.py <code_file> [<label>=<bound> ...]"
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,63 @@
+"""Тесты статического анализатора тактов."""
+
+import analyzer
+import machine
+import pytest
+import translator
+from isa import read_code
+
+STRAIGHT_LINE = """
+section .data:
+    value: 5
+    pointer: value
+section .text:
+    load r0, value
+    load r1, (pointer)
+    store r1, (pointer)
+    add r2, r0, r1
+    cmp r2, r0
+    move r3, #1
+    out r3, 1
+    halt
+"""
+
+COUNTER_LOOP = """
+section .text:
+    move r0, #0
+    move r1, #4
+    .loop:
+        inc r0
+        cmp r0, r1
+        jnz .loop
+    halt
+"""
+
+
+def test_straight_line_estimate_matches_simulation():
+    code = translator.translate(STRAIGHT_LINE)
+    _, _, ticks = machine.simulation(code, [])
+    estimator = analyzer.WorstCaseEstimator(analyzer.build_cfg(code), {})
+    assert 3 + estimator.estimate(code[0]["op"]) == ticks
+
+
+def test_bounded_loop_estimate_matches_simulation():
+    code = translator.translate(COUNTER_LOOP)
+    _, _, ticks = machine.simulation(code, [])
+    cfg = analyzer.build_cfg(code)
+    estimator = analyzer.WorstCaseEstimator(cfg, {".loop": 4})
+    assert 3 + estimator.estimate(code[0]["op"]) == ticks
+    assert [loop.iteration_cost for loop in estimator.loops] == [7]
+
+
+def test_unbounded_loop_is_reported():
+    code = translator.translate(COUNTER_LOOP)
+    estimator = analyzer.WorstCaseEstimator(analyzer.build_cfg(code), {})
+    with pytest.raises(analyzer.UnboundedLoopError):
+        estimator.estimate(code[0]["op"])
+
+
+def test_interrupt_handler_estimate(tmp_path):
+    target = tmp_path / "cat.json"
+    translator.main("examples/cat.asm", str(target))
+    report = analyzer.analyze(read_code(str(target)), {".loop": 1})
+    assert "  int1: 18 ticks" in report.splitlines()
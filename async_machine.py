@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+"""Модель процессора с вводом-выводом через потоки asyncio.
+
+Вместо заранее заданного расписания `(tick, char)` символы читаются из
+асинхронного потока (stdin, именованный канал или Unix-сокет) и попадают в
+`PortManager` на такте, соответствующем моменту получения: часы модели
+переводят время в такты (`ticks_per_second`). Символы, полученные одним
+блоком, поступают не чаще одного за `char_ticks` тактов, как по
+последовательной линии, иначе обработчик прерывания не успевал бы их читать.
+Вывод пишется в асинхронный приёмник (stdout или тот же сокет).
+
+Моделирование идёт пакетами до `batch` инструкций, не обгоняя часы. Между
+пакетами управление возвращается циклу событий: сбрасывается вывод, а если
+модель опередила часы -- ожидание вместо холостых инструкций. Простой по
+`wait` идёт по часам: модель ждёт ввода, пока он не придёт.
+
+Живая модель работает, пока не выполнит `halt`: лимит инструкций пакетной
+модели (`INSTRUCTION_LIMIT`) здесь не действует, его можно задать явно.
+
+Интерфейс командной строки:
+`async_machine.py <machine_code_file> [--input -|<fifo>|unix:<socket>] [--tps N] [--batch N] [--char-ticks N]
+[--instruction-limit N]`.
+"""
+
+import argparse
+import asyncio
+import codecs
+import sys
+import time
+
+from isa import read_code
+from machine import ControlUnit, DataPath, initiate_interruption, skip_idle
+from tracer import TraceSink
+
+TICKS_PER_SECOND = 10000
+BATCH_INSTRUCTIONS = 1000
+CHAR_TICKS = 100
+READ_CHUNK = 4096
+
+
+class Clock:
+    """Часы модели: время от запуска, переведённое в такты"""
+
+    ticks_per_second: int = None
+    start: float = None
+
+    def __init__(self, ticks_per_second: int):
+        self.ticks_per_second = ticks_per_second
+        self.start = time.monotonic()
+
+    def now(self) -> int:
+        return int((time.monotonic() - self.start) * self.ticks_per_second)
+
+    def delay(self, tick: int) -> float:
+        """Секунд до наступления такта `tick`"""
+        return max(tick / self.ticks_per_second - (time.monotonic() - self.start), 0)
+
+
+class AsyncMachine:
+    data_path: DataPath = None
+    control_unit: ControlUnit = None
+    clock: Clock = None
+    batch: int = None
+    instruction_limit: int = None
+    instruction_counter: int = None
+    input_tokens: list = None
+    char_ticks: int = None
+    next_arrival: int = None
+    written: int = None
+    halted: str = None
+
+    def __init__(
+        self,
+        code: list,
+        ticks_per_second: int = TICKS_PER_SECOND,
+        batch: int = BATCH_INSTRUCTIONS,
+        trace_sink: TraceSink | None = None,
+        instruction_limit: int | None = None,
+        char_ticks: int = CHAR_TICKS,
+    ):
+        """`instruction_limit` -- остановка после числа инструкций, `None` -- без ограничения"""
+        self.data_path = DataPath(code)
+        self.control_unit = ControlUnit(self.data_path, trace_sink)
+        self.clock = Clock(ticks_per_second)
+        self.batch = batch
+        self.instruction_limit = instruction_limit
+        self.instruction_counter = 1
+        self.input_tokens = []
+        self.char_ticks = char_ticks
+        self.next_arrival = 0
+        self.written = 0
+
+    async def feed(self, reader: asyncio.StreamReader) -> None:
+        """Символы из потока становятся входными событиями на текущем такте часов"""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while chunk := await reader.read(READ_CHUNK):
+            tick = max(self.clock.now(), self.next_arrival)
+            for char in decoder.decode(chunk):
+                self.input_tokens.append((tick, char))
+                tick += self.char_ticks
+            self.next_arrival = tick
+
+    def run_batch(self) -> None:
+        """Выполнить до `batch` инструкций, не обгоняя часы"""
+        control_unit = self.control_unit
+        deadline = self.clock.now()
+        for _ in range(self.batch):
+            if control_unit.waiting and not self.wake(deadline):
+                return
+            if control_unit.tick_counter > deadline:
+                return
+            if self.instruction_limit is not None and self.instruction_counter >= self.instruction_limit:
+                self.halted = "Instruction limit reached"
+                return
+            self.instruction_counter += 1
+            try:
+                control_unit.decode_and_execute_instruction()
+            except StopIteration:
+                self.halted = "halt"
+                return
+            if not control_unit.waiting:
+                self.deliver()
+
+    def wake(self, deadline: int) -> bool:
+        """Простой по `wait` не дальше часов; `False` -- событие ещё не наступило"""
+        if not skip_idle(self.control_unit, self.input_tokens, deadline):
+            return False
+        self.deliver()
+        return True
+
+    def deliver(self) -> None:
+        self.input_tokens = initiate_interruption(self.control_unit, self.input_tokens)
+        self.control_unit.check_and_handle_interruption()
+
+    async def flush(self, writer) -> None:
+        """Записать в приёмник вывод, накопленный за пакет"""
+        output = self.data_path.port_manager.output_buffer
+        if self.written < len(output):
+            writer.write("".join(output[self.written :]).encode())
+            self.written = len(output)
+            await writer.drain()
+
+    async def run(self, reader: asyncio.StreamReader, writer) -> tuple:
+        """Моделировать до `halt` или лимита инструкций: (число инструкций, число тактов)"""
+        self.control_unit.initialization_cycle()
+        feeder = asyncio.create_task(self.feed(reader))
+        try:
+            while self.halted is None:
+                self.run_batch()
+                await self.flush(writer)
+                await asyncio.sleep(self.clock.delay(self.control_unit.tick_counter))
+        except Exception as e:
+            self.control_unit.trace.finish(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            feeder.cancel()
+        self.control_unit.trace.finish(None if self.halted == "halt" else self.halted)
+        return self.instruction_counter, self.control_unit.tick_counter
+
+
+class StdoutSink:
+    """Приёмник вывода в stdout с интерфейсом `asyncio.StreamWriter`"""
+
+    @staticmethod
+    def write(data: bytes) -> None:
+        sys.stdout.buffer.write(data)
+
+    @staticmethod
+    async def drain() -> None:
+        sys.stdout.buffer.flush()
+
+    def close(self) -> None:
+        pass
+
+
+async def open_streams(source: str) -> tuple:
+    """Поток ввода и приёмник вывода: `-` -- stdin/stdout, `unix:<path>` -- сокет, иначе именованный канал"""
+    loop = asyncio.get_running_loop()
+    if source.startswith("unix:"):
+        return await asyncio.open_unix_connection(source.removeprefix("unix:"))
+
+    reader = asyncio.StreamReader()
+    # Открытие именованного канала ждёт пишущую сторону, поэтому не в цикле событий
+    pipe = sys.stdin if source == "-" else await asyncio.to_thread(open, source, "rb")
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader, StdoutSink()
+
+
+async def main(
+    code_file: str, source: str, ticks_per_second: int, batch: int, char_ticks: int, instruction_limit: int | None
+):
+    model = AsyncMachine(read_code(code_file), ticks_per_second, batch, None, instruction_limit, char_ticks)
+    reader, writer = await open_streams(source)
+    instruction_counter, ticks = await model.run(reader, writer)
+    writer.close()
+    print(f"\ninstr_counter: {instruction_counter} ticks: {ticks}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Модель процессора, ввод-вывод через asyncio")
+    parser.add_argument("code_file")
+    parser.add_argument("--input", default="-", help="'-' (stdin), путь к именованному каналу или unix:<путь к сокету>")
+    parser.add_argument("--tps", type=int, default=TICKS_PER_SECOND, help="тактов модели в секунду")
+    parser.add_argument(
+        "--batch", type=int, default=BATCH_INSTRUCTIONS, help="инструкций между обращениями к циклу событий"
+    )
+    parser.add_argument("--char-ticks", type=int, default=CHAR_TICKS, help="минимум тактов между символами ввода")
+    parser.add_argument(
+        "--instruction-limit", type=int, help="остановить после N инструкций; по умолчанию без ограничения"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.code_file, args.input, args.tps, args.batch, args.char_ticks, args.instruction_limit))
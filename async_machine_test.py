@@ -0,0 +1,68 @@
+"""Тесты модели с асинхронным вводом-выводом."""
+
+import asyncio
+
+import async_machine
+import machine
+import translator
+
+CAT = """
+section .text:
+    ei
+    .loop:
+        jmp .loop
+    .end:
+        halt
+.int1:
+    in r1, 0
+    move r2, #48
+    cmp r1, r2
+    jz .end
+    out r1, 1
+    iret
+"""
+
+
+class BufferSink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    async def drain(self) -> None:
+        pass
+
+
+async def run_cat(chunks: list, ticks_per_second: int, instruction_limit: int | None = None) -> tuple:
+    model = async_machine.AsyncMachine(
+        translator.translate(CAT), ticks_per_second, batch=50, instruction_limit=instruction_limit
+    )
+    reader, sink = asyncio.StreamReader(), BufferSink()
+    for chunk in chunks:
+        reader.feed_data(chunk)
+    reader.feed_eof()
+    _, ticks = await model.run(reader, sink)
+    return sink.data.decode(), model, ticks
+
+
+def test_chunk_characters_are_spaced_and_echoed():
+    output, model, ticks = asyncio.run(run_cat([b"h\xc3", b"\xa9llo0"], 10**6))
+    assert output == "héllo"
+    assert model.halted == "halt"
+    assert ticks >= 5 * async_machine.CHAR_TICKS
+
+
+def test_model_does_not_outrun_clock():
+    _, model, ticks = asyncio.run(run_cat([b"ab0"], 4000))
+    assert ticks <= model.clock.now() + 50 * 20
+
+
+def test_live_model_has_no_instruction_limit_by_default():
+    _, model, _ = asyncio.run(run_cat([b"a" * 800 + b"0"], 10**6))
+    assert model.halted == "halt"
+    assert model.instruction_counter > machine.INSTRUCTION_LIMIT
+
+    _, model, _ = asyncio.run(run_cat([b"a0"], 10**6, instruction_limit=100))
+    assert model.halted == "Instruction limit reached"
+    assert model.instruction_counter == 100
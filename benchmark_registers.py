@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+"""Микробенчмарк доступа к регистрам: прежний `RegistersFile` на getattr/setattr
+с f-строкой против текущего, хранящего регистры в списке.
+
+Запуск: `benchmark_registers.py [<repeat>]`
+"""
+
+import sys
+import timeit
+
+from machine import InvalidRegisterNumberError, RegistersFile
+
+# Смесь обращений, как в цикле исполнения: выбор r0..r12, ar, ipc и ir
+PATTERN = (0, 3, 12, 13, 15, 7)
+
+
+class LegacyRegistersFile:
+    """Реализация до перехода на список (для сравнения)"""
+
+    def __init__(self):
+        for number in range(13):
+            setattr(self, f"r{number}", 0)
+        self.ar = 0
+        self.ir = {}
+        self.ipc = 0
+        self.left_out = 0
+        self.right_out = None
+
+    def latch_reg_n(self, number: int, value: int) -> None:
+        if 0 <= number <= 12:
+            setattr(self, f"r{number}", value)
+        elif number == 13:
+            self.ar = value
+        elif number == 15:
+            self.ipc = value
+        else:
+            raise InvalidRegisterNumberError()
+
+    def sel_left_reg(self, number: int) -> None:
+        if 0 <= number <= 12:
+            self.left_out = getattr(self, f"r{number}")
+        elif number == 13:
+            self.left_out = self.ar
+        elif number == 15:
+            self.left_out = self.ipc
+        else:
+            raise InvalidRegisterNumberError()
+
+    def sel_right_reg(self, number: int) -> None:
+        if 0 <= number <= 12:
+            self.right_out = getattr(self, f"r{number}")
+        elif number == 13:
+            self.right_out = self.ar
+        elif number == 14:
+            self.right_out = self.ir
+        elif number == 15:
+            self.right_out = self.ipc
+        else:
+            raise InvalidRegisterNumberError()
+
+
+def access_cycle(registers) -> None:
+    for number in PATTERN:
+        registers.latch_reg_n(number, number)
+        registers.sel_left_reg(number)
+        registers.sel_right_reg(number)
+    registers.sel_right_reg(14)
+
+
+def measure(registers, repeat: int) -> float:
+    """Наносекунд на одно обращение к регистру"""
+    accesses = len(PATTERN) * 3 + 1
+    seconds = min(timeit.repeat(lambda: access_cycle(registers), number=repeat, repeat=5))
+    return seconds / (repeat * accesses) * 1e9
+
+
+def main(repeat: int = 100000):
+    before = measure(LegacyRegistersFile(), repeat)
+    after = measure(RegistersFile(), repeat)
+    print(f"getattr/setattr: {before:.1f} ns per access")
+    print(f"list:            {after:.1f} ns per access")
+    print(f"speedup:         {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,353 @@
+#!/usr/bin/python3
+"""Отладчик модели процессора.
+
+Точки останова по адресу хранятся битовой картой на всю память
+(`bytearray(MEMORY_SIZE)`), поэтому цикл `Debugger.resume` проверяет одну
+ячейку массива на инструкцию, а без точек останова только выполняет шаги.
+Точка останова на текущем `PC` срабатывает до первого шага, если отладчик
+не остановился на ней только что. Точке останова можно задать условие на
+значение регистра (`r1 == 48`), оно вычисляется только при попадании на
+адрес. Точки наблюдения за памятью подключаются к тракту данных как
+наблюдатель обращений (как профиль памяти) и только пока заданы. Обычная
+`machine.simulation` отладчиком не затрагивается. Слияние инструкций
+отладчик не включает; если включить его (`control_unit.fusion`), точка
+останова внутри макрооперации (на второй или третьей её ячейке) не сработает.
+
+Шаг по тактам: очередная инструкция выполняется целиком, а её такты
+сохраняются и выдаются по одному снимком в формате `tracer.TRACE_FIELDS`.
+
+Интерактивный режим: `debugger.py <machine_code_file> <input_file>`.
+"""
+
+import cmd
+import collections
+import operator
+import re
+import sys
+
+from isa import DATA_READ, DATA_WRITE, MEMORY_SIZE, OPERAND_FETCH, collect_labels, read_code
+from machine import INSTRUCTION_LIMIT, ControlUnit, DataPath, execute_step, read_input_tokens
+from tracer import TraceSink, format_tick
+
+BREAKPOINT = 1
+WATCH_READ = 1 << DATA_READ | 1 << OPERAND_FETCH
+WATCH_WRITE = 1 << DATA_WRITE
+WATCH_MODES = {"r": WATCH_READ, "w": WATCH_WRITE, "rw": WATCH_READ | WATCH_WRITE}
+REGISTER_NAMES = (*(f"r{number}" for number in range(13)), "ar", "ipc")
+CONDITION = re.compile(r"^\s*(r\d+|ar|ipc)\s*(==|!=|<=|>=|<|>)\s*(-?\d+)\s*$")
+COMPARISONS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+
+class Condition:
+    """Условие точки останова на значение регистра: `<регистр> <сравнение> <число>`"""
+
+    register: str = None
+    compare = None
+    value: int = None
+    text: str = None
+
+    def __init__(self, text: str):
+        match = CONDITION.match(text)
+        if match is None or match.group(1) not in REGISTER_NAMES:
+            raise InvalidConditionError(text)
+        self.register, comparison, value = match.groups()
+        self.compare = COMPARISONS[comparison]
+        self.value = int(value)
+        self.text = text.strip()
+
+    def holds(self, register_file) -> bool:
+        current = getattr(register_file, self.register)
+        return isinstance(current, int) and self.compare(current, self.value)
+
+
+class TickRecorder(TraceSink):
+    """Снимки тактов текущей инструкции для шага по тактам"""
+
+    states: collections.deque = None
+
+    def __init__(self):
+        self.states = collections.deque()
+
+    def tick(self, state: tuple) -> None:
+        self.states.append(state)
+
+
+class Debugger:
+    breakpoints: bytearray = None
+    breakpoint_count: int = None
+    # Адрес точки останова, на которой `resume` остановился; пока `PC` не менялся, она не срабатывает снова
+    stopped_at: int = None
+    conditions: dict = None
+    watchpoints: bytearray = None
+    watch_count: int = None
+    break_on_interrupt: bool = None
+    data_path: DataPath = None
+    control_unit: ControlUnit = None
+    recorder: TickRecorder = None
+    input_tokens: list = None
+    instruction_counter: int = None
+    halted: str = None
+    reason: str = None
+
+    def __init__(self, code: list, input_tokens: list):
+        self.breakpoints = bytearray(MEMORY_SIZE)
+        self.breakpoint_count = 0
+        self.conditions = {}
+        self.watchpoints = bytearray(MEMORY_SIZE)
+        self.watch_count = 0
+        self.break_on_interrupt = False
+        self.recorder = TickRecorder()
+        self.data_path = DataPath(code)
+        self.control_unit = ControlUnit(self.data_path, self.recorder)
+        self.input_tokens = list(input_tokens)
+        self.control_unit.initialization_cycle()
+        self.instruction_counter = 1
+
+    def add_breakpoint(self, address: int, condition: str | None = None) -> None:
+        if not self.breakpoints[address]:
+            self.breakpoint_count += 1
+        self.breakpoints[address] = BREAKPOINT
+        if condition is None:
+            self.conditions.pop(address, None)
+        else:
+            self.conditions[address] = Condition(condition)
+
+    def add_watchpoint(self, address: int, mode: str = "w") -> None:
+        if not self.watchpoints[address]:
+            if self.watch_count == 0:
+                self.data_path.add_memory_observer(self)
+            self.watch_count += 1
+        self.watchpoints[address] = WATCH_MODES[mode]
+
+    def delete(self, address: int) -> None:
+        """Снять точку останова и точку наблюдения с адреса"""
+        if self.breakpoints[address]:
+            self.breakpoints[address] = 0
+            self.breakpoint_count -= 1
+        self.conditions.pop(address, None)
+        if self.watchpoints[address]:
+            self.watchpoints[address] = 0
+            self.watch_count -= 1
+            if self.watch_count == 0:
+                self.data_path.remove_memory_observer(self)
+
+    def record(self, address: int, access: int) -> None:
+        """Обращение к памяти от тракта данных (только при заданных точках наблюдения)"""
+        if self.watchpoints[address] & (1 << access):
+            kind = "write" if access == DATA_WRITE else "read"
+            self.reason = f"watchpoint: {kind} {address}"
+
+    def step(self) -> str | None:
+        """Выполнить одну инструкцию и проверку прерываний, как цикл `simulation`"""
+        if self.halted is not None:
+            return self.halted
+        self.stopped_at = None
+        control_unit = self.control_unit
+        self.instruction_counter += 1
+        taken = self.data_path.interruption_controller.taken
+        try:
+            self.input_tokens = execute_step(control_unit, self.input_tokens)
+        except StopIteration:
+            return self.stop("wait without pending events" if control_unit.waiting else "halted")
+        except (AssertionError, ValueError) as e:
+            # Ошибка модели останавливает машину, но состояние остаётся доступным для просмотра
+            return self.stop(f"{type(e).__name__}: {e}")
+        if self.break_on_interrupt and self.data_path.interruption_controller.taken != taken:
+            self.reason = "interrupt"
+        if self.instruction_counter >= INSTRUCTION_LIMIT:
+            return self.stop("instruction limit reached")
+        return self.reason
+
+    def stop(self, reason: str) -> str:
+        """Машина остановлена; дальнейшие шаги возвращают причину остановки"""
+        self.halted = reason
+        self.reason = reason
+        return reason
+
+    def step_instruction(self) -> str | None:
+        """Шаг по инструкции; после шагов по тактам -- завершить текущую инструкцию"""
+        self.reason = None
+        if self.recorder.states:
+            self.recorder.states.clear()
+            return None
+        return self.step()
+
+    def step_tick(self) -> tuple | None:
+        """Снимок следующего такта или `None`, если машина остановлена"""
+        if not self.recorder.states and self.halted is None:
+            self.reason = None
+            self.recorder.active = True
+            try:
+                self.step()
+            finally:
+                self.recorder.active = False
+        return self.recorder.states.popleft() if self.recorder.states else None
+
+    def resume(self) -> str:
+        """Выполнять до точки останова, точки наблюдения, прерывания или остановки машины"""
+        self.recorder.states.clear()
+        self.reason = None
+        if self.breakpoint_count == 0:
+            while (reason := self.step()) is None:
+                pass
+            return reason
+        breakpoints, data_path = self.breakpoints, self.data_path
+        pc = data_path.pc
+        if self.halted is None and pc != self.stopped_at and breakpoints[pc] and self.breakpoint_hit(pc):
+            return self.stop_at_breakpoint(pc)
+        while (reason := self.step()) is None:
+            if breakpoints[data_path.pc] and self.breakpoint_hit(data_path.pc):
+                return self.stop_at_breakpoint(data_path.pc)
+        return reason
+
+    def stop_at_breakpoint(self, address: int) -> str:
+        self.stopped_at = address
+        return f"breakpoint: {address}"
+
+    def breakpoint_hit(self, address: int) -> bool:
+        condition = self.conditions.get(address)
+        return condition is None or condition.holds(self.data_path.register_file)
+
+    def registers(self) -> dict:
+        register_file = self.data_path.register_file
+        state = {name: getattr(register_file, name) for name in REGISTER_NAMES}
+        state.update(pc=self.data_path.pc, zero=int(self.data_path.alu.zero_flag), ir=register_file.ir)
+        return state
+
+    def memory(self, address: int, count: int = 1) -> list:
+        return self.data_path.memory[address : address + count]
+
+    @property
+    def output(self) -> str:
+        return "".join(self.data_path.port_manager.output_buffer)
+
+
+class DebuggerShell(cmd.Cmd):
+    """Команды: break, watch, delete, catch, continue, step, tick, regs, mem, output, quit"""
+
+    prompt = "(rm) "
+    debugger: Debugger = None
+    code: list = None
+    addresses: dict = None
+
+    def __init__(self, debugger: Debugger, code: list):
+        super().__init__()
+        self.debugger = debugger
+        self.code = code
+        self.addresses = {label: address for address, label in collect_labels(code).items()}
+        for vector, address in code[-1].items():
+            if isinstance(address, int):
+                self.addresses[f".{vector}"] = address
+
+    def address(self, location: str) -> int:
+        """Адрес по числу или метке"""
+        if location in self.addresses:
+            return self.addresses[location]
+        if not location.isdigit() or int(location) >= MEMORY_SIZE:
+            raise UnknownLocationError(location)
+        return int(location)
+
+    def onecmd(self, line: str) -> bool:
+        try:
+            return super().onecmd(line)
+        except ValueError as e:
+            print(e)
+            return False
+        except AssertionError as e:
+            print(self.debugger.stop(f"{type(e).__name__}: {e}"))
+            return False
+
+    def where(self, reason: str | None) -> None:
+        pc = self.debugger.data_path.pc
+        # После ошибки модели PC может указывать за пределы памяти
+        cell = self.debugger.data_path.memory[pc] if pc < MEMORY_SIZE else None
+        instruction = f"{cell.get('opcode')} {cell.get('op', '')}".strip() if isinstance(cell, dict) else cell
+        print(f"{reason or 'stopped'} at {pc}: {instruction}")
+
+    def do_break(self, arg: str) -> None:
+        """break <адрес|метка> [if <регистр> <сравнение> <число>]"""
+        location, _, condition = arg.partition(" if ")
+        self.debugger.add_breakpoint(self.address(location.strip()), condition or None)
+
+    def do_watch(self, arg: str) -> None:
+        """watch <адрес|метка> [r|w|rw]"""
+        location, mode = [*arg.split(), "w"][:2]
+        if mode not in WATCH_MODES:
+            raise UnknownLocationError(mode)
+        self.debugger.add_watchpoint(self.address(location), mode)
+
+    def do_delete(self, arg: str) -> None:
+        """delete <адрес|метка>"""
+        self.debugger.delete(self.address(arg.strip()))
+
+    def do_catch(self, arg: str) -> None:
+        """catch -- переключить остановку на входе в обработчик прерывания"""
+        self.debugger.break_on_interrupt = not self.debugger.break_on_interrupt
+        print("break on interrupt:", "on" if self.debugger.break_on_interrupt else "off")
+
+    def do_continue(self, arg: str) -> None:
+        """continue -- выполнять до остановки"""
+        self.where(self.debugger.resume())
+
+    def do_step(self, arg: str) -> None:
+        """step [n] -- выполнить n инструкций"""
+        for _ in range(int(arg or 1)):
+            reason = self.debugger.step_instruction()
+            if reason is not None:
+                break
+        self.where(reason)
+
+    def do_tick(self, arg: str) -> None:
+        """tick -- выполнить один такт"""
+        state = self.debugger.step_tick()
+        print(self.debugger.halted if state is None else format_tick(state))
+
+    def do_regs(self, arg: str) -> None:
+        """regs -- регистры, PC и флаг нуля"""
+        print(" ".join(f"{name}: {value}" for name, value in self.debugger.registers().items()))
+
+    def do_mem(self, arg: str) -> None:
+        """mem <адрес|метка> [количество]"""
+        location, count = [*arg.split(), "1"][:2]
+        address = self.address(location)
+        for offset, cell in enumerate(self.debugger.memory(address, int(count))):
+            print(f"{address + offset}: {cell}")
+
+    def do_output(self, arg: str) -> None:
+        """output -- выведенное программой"""
+        print(repr(self.debugger.output))
+
+    def do_quit(self, arg: str) -> bool:
+        """quit -- выйти"""
+        return True
+
+    do_c = do_continue
+    do_s = do_step
+    do_q = do_quit
+
+
+def main(code_file: str, input_file: str):
+    code = read_code(code_file)
+    DebuggerShell(Debugger(code, read_input_tokens(input_file)), code).cmdloop()
+
+
+class InvalidConditionError(ValueError):
+    def __init__(self, text):
+        super().__init__(f"Invalid breakpoint condition {text!r}, expected e.g. 'r1 == 48'")
+
+
+class UnknownLocationError(ValueError):
+    def __init__(self, location):
+        super().__init__(f"Unknown location {location}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 3, "Wrong arguments: debugger.py <machine_code_file> <input_file>"
+    main(sys.argv[1], sys.argv[2])
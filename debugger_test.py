@@ -0,0 +1,100 @@
+"""Тесты отладчика."""
+
+import debugger
+import machine
+import memory_profile
+import pytest
+import tracer
+import translator
+from isa import DATA_WRITE, MEMORY_SIZE
+
+COUNTER = """
+section .data:
+    counter: 0
+section .text:
+    .loop:
+        load r0, counter
+        inc r0
+        store r0, counter
+        move r1, #3
+        cmp r0, r1
+        jnz .loop
+    halt
+"""
+LOOP, COUNTER_CELL = 2, 1
+
+
+def test_run_without_breakpoints_matches_simulation():
+    code = translator.translate(COUNTER)
+    session = debugger.Debugger(code, [])
+    assert session.resume() == "halted"
+    _, instructions, ticks = machine.simulation(code, [])
+    assert (session.instruction_counter, session.control_unit.tick_counter) == (instructions, ticks)
+
+
+def test_conditional_breakpoint_and_watchpoint():
+    session = debugger.Debugger(translator.translate(COUNTER), [])
+    session.add_breakpoint(LOOP, "r0 == 2")
+    assert session.resume() == f"breakpoint: {LOOP}"
+    assert session.registers()["r0"] == 2
+
+    session.delete(LOOP)
+    session.add_watchpoint(COUNTER_CELL, "w")
+    assert session.resume() == f"watchpoint: write {COUNTER_CELL}"
+    assert session.memory(COUNTER_CELL) == [{"data": 3}]
+
+
+def test_breakpoint_on_first_instruction():
+    session = debugger.Debugger(translator.translate(COUNTER), [])
+    session.add_breakpoint(LOOP)
+    assert session.resume() == f"breakpoint: {LOOP}"
+    assert session.instruction_counter == 1
+    assert session.resume() == f"breakpoint: {LOOP}"
+    assert session.memory(COUNTER_CELL) == [{"data": 1}]
+
+
+def test_watchpoints_keep_other_memory_observers():
+    session = debugger.Debugger(translator.translate(COUNTER), [])
+    profile = memory_profile.MemoryProfile(MEMORY_SIZE)
+    profile.attach(session.control_unit)
+    session.add_watchpoint(COUNTER_CELL, "w")
+    session.delete(COUNTER_CELL)
+    assert session.resume() == "halted"
+    assert session.data_path.memory_observers == [profile]
+    assert profile.row(COUNTER_CELL)[DATA_WRITE] == 3
+
+
+def test_step_by_tick_matches_trace():
+    code = translator.translate(COUNTER)
+    full = tracer.RingBufferTraceSink(10000)
+    machine.simulation(code, [], full)
+    expected = [entry for entry in full.entries if not isinstance(entry, str)]
+
+    session = debugger.Debugger(code, [])
+    ticks = list(iter(session.step_tick, None))
+    assert [tracer.format_tick(state) for state in ticks] == [tracer.format_tick(state) for state in expected[3:]]
+
+
+def test_invalid_condition():
+    with pytest.raises(debugger.InvalidConditionError):
+        debugger.Condition("pc = 3")
+
+
+OUT_OF_MEMORY = """
+section .data:
+    pointer: 2000000
+section .text:
+    move r0, #1
+    store r0, (pointer)
+    halt
+"""
+
+
+def test_model_error_halts_session_but_keeps_state(capsys):
+    session = debugger.Debugger(translator.translate(OUT_OF_MEMORY), [])
+    shell = debugger.DebuggerShell(session, translator.translate(OUT_OF_MEMORY))
+    assert not shell.onecmd("continue")
+    assert session.halted.startswith("AssertionError")
+    assert session.registers()["r0"] == 1
+    assert not shell.onecmd("step")
+    assert "AssertionError" in capsys.readouterr().out
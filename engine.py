@@ -0,0 +1,443 @@
+#!/usr/bin/python3
+"""Быстрая модель процессора с точностью до инструкции.
+
+Вместо сигналов тракта данных по тактам каждая инструкция при первом
+выполнении декодируется в замыкание, которое сразу меняет архитектурное
+состояние и прибавляет к счётчику тактов столько же, сколько заняла бы
+инструкция в `ControlUnit` (побочные эффекты АЛУ -- флаг нуля от вычисления
+адресов, `AR`, `IPC` -- сохраняются). Запись в ячейку сбрасывает её
+декодированную форму, так что самомодифицирующийся код выполняется верно.
+Линии прерываний, их приоритеты и таймер -- те же `InterruptionController`
+и `Timer`, что у эталонной модели.
+
+Журнал тактов не ведётся. Соответствие эталонной модели проверяется
+`lockstep.py`.
+
+Интерфейс командной строки: `engine.py <machine_code_file> <input_file>`.
+"""
+
+import sys
+
+from isa import (
+    DIRECTION_ADDRESS,
+    HART_ID_PORT_ADDRESS,
+    INDERECTION_ADDRESS,
+    INPUT_INTERRUPTION_LINE,
+    INPUT_PORT_ADDRESS,
+    MEMORY_SIZE,
+    OUTPUT_PORT_ADDRESS,
+    REGISTER_ADDRESS,
+    TIMER_INTERRUPTION_LINE,
+    TIMER_PORT_ADDRESS,
+    Opcode,
+    read_code,
+)
+from machine import (
+    ALU_OPCODE_BINARY_HANDLERS,
+    INSTRUCTION_LIMIT,
+    IPC_REGISTER,
+    IR_REGISTER,
+    LATCHABLE_REGISTERS,
+    REGISTERS_COUNT,
+    RIGHT_OUT_REGISTERS,
+    Alu,
+    InterruptionController,
+    InvalidInputPortNumberError,
+    InvalidRegisterNumberError,
+    MissingInterruptionHandlerError,
+    Timer,
+    read_input_tokens,
+)
+
+AR_REGISTER = 13
+RETURN_REGISTER = 12
+INTERRUPTION_VECTOR = MEMORY_SIZE - 1
+
+
+def latchable(number) -> int:
+    if number not in LATCHABLE_REGISTERS:
+        raise InvalidRegisterNumberError()
+    return number
+
+
+def readable(number) -> int:
+    if number not in RIGHT_OUT_REGISTERS:
+        raise InvalidRegisterNumberError()
+    return number
+
+
+class Engine:
+    memory: list = None
+    registers: list = None
+    pc: int = None
+    zero_flag: int = None
+    tick_counter: int = None
+    controller: InterruptionController = None
+    timer: Timer = None
+    interruption_enabled: bool = None
+    handling_interruption: bool = None
+    waiting: bool = None
+    port_0: int = None
+    port_1: int = None
+    hart_id: int = None
+    output_buffer: list = None
+    input_tokens: list = None
+    next_token: int = None
+    decoded: dict = None
+    # Адреса записей в память за шаг; `None` -- не записывать
+    writes: list = None
+
+    def __init__(self, code: list, input_tokens: list, nested: bool = False):
+        self.memory = [0] * MEMORY_SIZE
+        self.memory[: len(code) - 1] = code[:-1]
+        self.memory[-1] = code[-1]
+        self.registers = [0] * REGISTERS_COUNT
+        self.registers[IR_REGISTER] = {}
+        self.pc = 0
+        self.zero_flag = 0
+        self.tick_counter = 0
+        self.controller = InterruptionController(nested)
+        self.timer = Timer()
+        self.interruption_enabled = False
+        self.handling_interruption = False
+        self.waiting = False
+        self.port_0 = 0
+        self.port_1 = 0
+        self.hart_id = 0
+        self.output_buffer = []
+        self.input_tokens = input_tokens
+        self.next_token = 0
+        self.decoded = {}
+
+    def add(self, left, right) -> int:
+        """Сложение на АЛУ с переполнением и флагом нуля"""
+        value = Alu.handle_overflow(int(left + right))
+        self.zero_flag = 1 if value == 0 else 0
+        return value
+
+    def read(self, address: int):
+        assert address < MEMORY_SIZE, f"Memory doesn't have cell with index {address}"
+        return self.memory[address]
+
+    def write(self, address: int, value) -> None:
+        assert address < MEMORY_SIZE, f"Memory doesn't have cell with index {address}"
+        self.memory[address] = {"data": value}
+        self.decoded.pop(address, None)
+        if self.writes is not None:
+            self.writes.append(address)
+
+    def initialization_cycle(self) -> None:
+        cell = self.read(0)
+        Opcode(cell.get("opcode"))
+        self.registers[IR_REGISTER] = cell
+        self.registers[AR_REGISTER] = Alu.cut_operand(cell)
+        self.pc = self.add(0, self.registers[AR_REGISTER])
+        self.tick_counter += 3
+
+    def decode(self, address: int):
+        cell = self.read(address)
+        opcode = Opcode(cell.get("opcode"))
+        execute = getattr(self, "decode_" + opcode.value)(cell)
+        self.decoded[address] = (cell, execute)
+        return cell, execute
+
+    def execute_instruction(self) -> None:
+        """Выборка и выполнение одной инструкции; `halt` -- `StopIteration`"""
+        cell, execute = self.decoded.get(self.pc) or self.decode(self.pc)
+        self.registers[IR_REGISTER] = cell
+        self.tick_counter += 1
+        execute()
+
+    def operand_fetch(self, cell: dict) -> None:
+        registers = self.registers
+        registers[AR_REGISTER] = Alu.cut_operand(cell)
+        self.tick_counter += 1
+        address_type = cell.get("addrType")
+        if address_type == INDERECTION_ADDRESS:
+            registers[IPC_REGISTER] = self.pc
+            self.pc = self.add(0, registers[AR_REGISTER])
+            registers[AR_REGISTER] = self.read(self.pc).get("data")
+            self.pc = self.add(0, registers[AR_REGISTER])
+            self.tick_counter += 3
+        elif address_type == DIRECTION_ADDRESS:
+            registers[IPC_REGISTER] = self.pc
+            self.pc = self.add(0, registers[AR_REGISTER])
+            self.tick_counter += 2
+
+    def decode_load(self, cell: dict):
+        def execute():
+            self.operand_fetch(cell)
+            self.registers[latchable(cell.get("reg"))] = self.read(self.pc).get("data")
+            self.pc = self.add(1, self.registers[IPC_REGISTER])
+            self.tick_counter += 2
+
+        return execute
+
+    def decode_store(self, cell: dict):
+        def execute():
+            self.operand_fetch(cell)
+            self.write(self.pc, self.registers[readable(cell.get("reg"))])
+            self.pc = self.add(1, self.registers[IPC_REGISTER])
+            self.tick_counter += 2
+
+        return execute
+
+    def decode_cas(self, cell: dict):
+        expected, new = latchable(readable(cell.get("reg"))), readable(cell.get("op1"))
+        registers = self.registers
+
+        def execute():
+            self.operand_fetch(cell)
+            current = self.read(self.pc).get("data")
+            value = Alu.handle_overflow(current - registers[expected])
+            self.zero_flag = 1 if value == 0 else 0
+            if self.zero_flag:
+                self.write(self.pc, registers[new])
+            else:
+                registers[expected] = current
+            self.pc = registers[IPC_REGISTER] + 1
+            self.tick_counter += 3
+
+        return execute
+
+    def decode_binary(self, cell: dict):
+        operation = ALU_OPCODE_BINARY_HANDLERS[Opcode(cell["opcode"])]
+        left, right = latchable(cell.get("op2")), readable(cell.get("op3"))
+        target = latchable(cell.get("op1"))
+        registers = self.registers
+
+        def execute():
+            value = Alu.handle_overflow(operation(registers[left], registers[right]))
+            self.zero_flag = 1 if value == 0 else 0
+            registers[target] = value
+            self.pc += 1
+            self.tick_counter += 2
+
+        return execute
+
+    decode_add = decode_sub = decode_mod = decode_binary
+
+    def decode_inc(self, cell: dict):
+        number = latchable(readable(cell.get("op")))
+        registers = self.registers
+
+        def execute():
+            registers[number] = self.add(1, registers[number])
+            self.pc += 1
+            self.tick_counter += 2
+
+        return execute
+
+    def decode_cmp(self, cell: dict):
+        left, right = latchable(cell.get("op1")), readable(cell.get("op2"))
+        registers = self.registers
+
+        def execute():
+            value = Alu.handle_overflow(int(registers[left] - registers[right]))
+            self.zero_flag = 1 if value == 0 else 0
+            self.pc += 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_jz(self, cell: dict):
+        target = Alu.cut_operand(cell)
+
+        def execute():
+            self.pc = target if self.zero_flag == 1 else self.pc + 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_jnz(self, cell: dict):
+        target = Alu.cut_operand(cell)
+
+        def execute():
+            self.pc = target if self.zero_flag == 0 else self.pc + 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_jmp(self, cell: dict):
+        target = Alu.cut_operand(cell)
+
+        def execute():
+            self.pc = target
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_move(self, cell: dict):
+        registers = self.registers
+        if cell.get("addrType") == REGISTER_ADDRESS:
+            source, target = readable(cell.get("op")), latchable(cell.get("reg"))
+
+            def execute():
+                registers[target] = self.add(0, registers[source])
+                self.pc += 1
+                self.tick_counter += 2
+
+            return execute
+
+        value, target = Alu.cut_operand(cell), latchable(cell.get("reg"))
+
+        def execute_immediate():
+            registers[target] = value
+            self.pc += 1
+            self.tick_counter += 2
+
+        return execute_immediate
+
+    def decode_iret(self, cell: dict):
+        controller = self.controller
+
+        def execute():
+            controller.complete()
+            self.handling_interruption = bool(controller.in_service)
+            self.pc = self.add(0, self.registers[RETURN_REGISTER])
+            if controller.in_service:
+                self.registers[RETURN_REGISTER] = controller.return_stack.pop()
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_wait(self, cell: dict):
+        def execute():
+            self.waiting = True
+            self.pc += 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_ei(self, cell: dict):
+        return self.switch_interruptions(True)
+
+    def decode_di(self, cell: dict):
+        return self.switch_interruptions(False)
+
+    def switch_interruptions(self, enabled: bool):
+        def execute():
+            self.interruption_enabled = enabled
+            self.pc += 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_in(self, cell: dict):
+        port = Alu.cut_operand(cell)
+
+        def execute():
+            self.registers[AR_REGISTER] = port
+            self.tick_counter += 1
+            if port == INPUT_PORT_ADDRESS:
+                self.registers[latchable(cell.get("reg"))] = self.port_0
+            elif port == HART_ID_PORT_ADDRESS:
+                self.registers[latchable(cell.get("reg"))] = self.hart_id
+            else:
+                raise InvalidInputPortNumberError()
+            self.pc += 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_out(self, cell: dict):
+        port = Alu.cut_operand(cell)
+
+        def execute():
+            self.registers[AR_REGISTER] = port
+            self.tick_counter += 1
+            if port == TIMER_PORT_ADDRESS:
+                self.timer.program(self.add(0, self.registers[readable(cell.get("reg"))]), self.tick_counter)
+            elif port == OUTPUT_PORT_ADDRESS:
+                self.port_1 = self.add(0, self.registers[readable(cell.get("reg"))])
+                self.output_buffer.append(chr(self.port_1))
+            else:
+                raise InvalidInputPortNumberError()
+            self.pc += 1
+            self.tick_counter += 1
+
+        return execute
+
+    def decode_halt(self, cell: dict):
+        def execute():
+            raise StopIteration()
+
+        return execute
+
+    def initiate_interruption(self) -> None:
+        """Срок таймера и очередной символ ввода по расписанию, как `machine.initiate_interruption`"""
+        if self.timer.poll(self.tick_counter):
+            self.controller.generate_interruption(INTERRUPTION_VECTOR, TIMER_INTERRUPTION_LINE)
+        if self.next_token < len(self.input_tokens):
+            tick, char = self.input_tokens[self.next_token]
+            if self.tick_counter >= tick:
+                self.controller.generate_interruption(INTERRUPTION_VECTOR, INPUT_INTERRUPTION_LINE)
+                if char:
+                    self.port_0 = ord(char)
+                self.next_token += 1
+
+    def check_and_handle_interruption(self) -> None:
+        controller = self.controller
+        if not self.interruption_enabled or not controller.interruption:
+            return
+        line = controller.next_line()
+        if line is None:
+            return
+        if controller.in_service:
+            controller.return_stack.append(self.registers[RETURN_REGISTER])
+        controller.in_service.append(line)
+        controller.taken += 1
+        self.handling_interruption = True
+        self.registers[RETURN_REGISTER] = self.pc
+        self.pc = controller.interruption_address
+        self.registers[AR_REGISTER] = self.read(self.pc)
+        handler = self.registers[AR_REGISTER].get(f"int{line}")
+        if not isinstance(handler, int):
+            raise MissingInterruptionHandlerError(line)
+        self.pc = self.add(0, handler)
+        self.tick_counter += 3
+
+    def skip_idle(self) -> bool:
+        """Простой по `wait`, как `machine.skip_idle`"""
+        if not self.interruption_enabled or self.controller.next_line() is None:
+            events = [tick for tick, _ in self.input_tokens[self.next_token : self.next_token + 1]]
+            if self.timer.next_tick is not None:
+                events.append(self.timer.next_tick)
+            if not events:
+                return False
+            self.tick_counter = max(self.tick_counter, min(events))
+        self.waiting = False
+        return True
+
+    def step(self) -> None:
+        """Шаг цикла `simulation`: инструкция, простой по `wait`, ввод, прерывание"""
+        self.execute_instruction()
+        if self.waiting and not self.skip_idle():
+            raise StopIteration()
+        self.initiate_interruption()
+        self.check_and_handle_interruption()
+
+
+def run(code: list, input_tokens: list) -> tuple:
+    """Аналог `machine.simulation` без журнала: (вывод, число инструкций, число тактов)"""
+    engine = Engine(code, input_tokens)
+    engine.initialization_cycle()
+    instruction_counter = 1
+    try:
+        while instruction_counter < INSTRUCTION_LIMIT:
+            instruction_counter += 1
+            engine.step()
+    except StopIteration:
+        pass
+    return engine.output_buffer, instruction_counter, engine.tick_counter
+
+
+def main(code_file: str, input_file: str):
+    output, instruction_counter, ticks = run(read_code(code_file), read_input_tokens(input_file))
+    print("".join(output) + "\n")
+    print(f"instr_counter: {instruction_counter} ticks: {ticks}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) == 3, "Wrong arguments: engine.py <machine_code_file> <input_file>"
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+"""Выигрыш от слияния инструкций в макрооперации на golden-программах.
+
+Каждая программа из `golden/*_asm.yml` моделируется без слияния и со
+слиянием (`simulation(..., fusion=True)`) на том же расписании ввода. Вывод
+должен совпасть. В отчёт идут числа инструкций (макроопераций) и тактов и
+сэкономленное.
+
+Интерфейс командной строки: `fusion.py [<golden_yml> ...]`, по умолчанию все `golden/*_asm.yml`.
+"""
+
+import ast
+import sys
+from pathlib import Path
+
+from machine import simulation
+from ruamel.yaml import YAML
+from tracer import NullTraceSink
+from translator import translate
+
+GOLDEN_PATTERN = "golden/*_asm.yml"
+
+
+class Comparison:
+    name: str = None
+    instructions: int = None
+    fused_instructions: int = None
+    ticks: int = None
+    fused_ticks: int = None
+
+    def __init__(self, name: str, plain: tuple, fused: tuple):
+        self.name = name
+        self.instructions, self.ticks = plain
+        self.fused_instructions, self.fused_ticks = fused
+
+    def row(self) -> str:
+        saved_instructions = self.instructions - self.fused_instructions
+        saved_ticks = self.ticks - self.fused_ticks
+        return (
+            f"{self.name:<22} {self.instructions:>6} {self.fused_instructions:>6} {saved_instructions:>6}"
+            f" {self.ticks:>7} {self.fused_ticks:>7} {saved_ticks:>6} ({saved_ticks / self.ticks:.0%})"
+        )
+
+
+def compare(source: str, input_tokens: list, name: str = "") -> Comparison:
+    """Смоделировать программу без слияния и со слиянием"""
+    code = translate(source)
+    output, *plain = simulation(code, list(input_tokens), NullTraceSink())
+    fused_output, *fused = simulation(code, list(input_tokens), NullTraceSink(), fusion=True)
+    if fused_output != output:
+        raise FusionOutputMismatchError(name)
+    return Comparison(name, plain, fused)
+
+
+def compare_golden(path: Path) -> Comparison:
+    golden = YAML(typ="safe").load(path.read_text(encoding="utf-8"))
+    stdin = golden["in_stdin"].strip()
+    return compare(golden["in_source"], ast.literal_eval(stdin) if stdin else [], path.stem)
+
+
+def report(comparisons: list) -> str:
+    lines = [f"{'program':<22} {'instr':>6} {'fused':>6} {'saved':>6} {'ticks':>7} {'fused':>7} {'saved':>6}"]
+    lines.extend(comparison.row() for comparison in comparisons)
+    return "\n".join(lines)
+
+
+def main(paths: list):
+    paths = [Path(path) for path in paths] or sorted(Path().glob(GOLDEN_PATTERN))
+    print(report([compare_golden(path) for path in paths]))
+
+
+class FusionOutputMismatchError(AssertionError):
+    def __init__(self, name):
+        super().__init__(f"Output of {name or 'program'} differs with fusion")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
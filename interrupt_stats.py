@@ -0,0 +1,133 @@
+"""Задержка обработки прерываний ввода и потерянные символы.
+
+Для каждого входного события `(tick, char)` запоминаются такт поступления в
+`port_0`, такт входа в обработчик `.int1` и такт инструкции `in`, которая
+прочитала символ. Символ считается потерянным, если до его чтения пришёл
+следующий (перезаписан `port_0`) или моделирование закончилось. Причина
+потери определяется по состоянию на момент поступления:
+
+- `interrupts disabled` -- прерывания были запрещены и обработчик не вызывался;
+- `handler busy` -- обработчик `.int1` уже выполнялся, а его `iret` сбросил запрос
+  (запрос по входу, пришедший во время обработчика другой линии, сохраняется);
+- `overwritten port_0` -- обработчик вызван, но символ не успели прочитать.
+"""
+
+import math
+
+from isa import INPUT_INTERRUPTION_LINE
+
+LOST_DISABLED = "interrupts disabled"
+LOST_BUSY = "handler busy"
+LOST_OVERWRITTEN = "overwritten port_0"
+LOSS_REASONS = (LOST_DISABLED, LOST_BUSY, LOST_OVERWRITTEN)
+
+
+class InputEvent:
+    scheduled: int = None
+    char: str = None
+    arrival: int = None
+    handler_entry: int = None
+    read: int = None
+    lost: str = None
+    enabled_at_arrival: bool = None
+    busy_at_arrival: bool = None
+
+    def __init__(self, scheduled: int, char: str, arrival: int, enabled: bool, busy: bool):
+        self.scheduled = scheduled
+        self.char = char
+        self.arrival = arrival
+        self.enabled_at_arrival = enabled
+        self.busy_at_arrival = busy
+
+    def loss_reason(self) -> str:
+        if self.handler_entry is not None:
+            return LOST_OVERWRITTEN
+        if self.busy_at_arrival:
+            return LOST_BUSY
+        if not self.enabled_at_arrival:
+            return LOST_DISABLED
+        return LOST_OVERWRITTEN
+
+
+class InterruptStats:
+    events: list = None
+    control_unit = None
+
+    def __init__(self):
+        self.events = []
+
+    def attach(self, control_unit) -> None:
+        self.control_unit = control_unit
+        control_unit.interrupt_stats = self
+
+    def pending(self) -> InputEvent | None:
+        """Последнее событие, символ которого ещё лежит в `port_0` непрочитанным"""
+        if self.events and self.events[-1].read is None and self.events[-1].lost is None:
+            return self.events[-1]
+        return None
+
+    def arrival(self, scheduled: int, char: str) -> None:
+        previous = self.pending()
+        if previous is not None:
+            previous.lost = previous.loss_reason()
+        control_unit = self.control_unit
+        self.events.append(
+            InputEvent(
+                scheduled,
+                char,
+                control_unit.tick_counter,
+                control_unit.interruption_enabled,
+                INPUT_INTERRUPTION_LINE in control_unit.data_path.interruption_controller.in_service,
+            )
+        )
+
+    def handler_entry(self) -> None:
+        event = self.pending()
+        if event is not None and event.handler_entry is None:
+            event.handler_entry = self.control_unit.tick_counter
+
+    def read(self) -> None:
+        event = self.pending()
+        if event is not None:
+            event.read = self.control_unit.tick_counter
+
+    def finish(self) -> None:
+        """Непрочитанный к концу моделирования символ тоже потерян"""
+        event = self.pending()
+        if event is not None:
+            event.lost = event.loss_reason()
+
+
+def percentile(values: list, fraction: float) -> int:
+    """Значение по рангу (nearest-rank)
+
+    >>> percentile([5, 1, 3, 2, 4], 0.99)
+    5
+    >>> percentile(list(range(1, 201)), 0.99)
+    198
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def describe_latency(name: str, values: list) -> str:
+    if not values:
+        return f"{name}: -"
+    mean = sum(values) / len(values)
+    return f"{name}: min: {min(values)} mean: {mean:.1f} p99: {percentile(values, 0.99)} max: {max(values)}"
+
+
+def summary(events: list) -> str:
+    lost = [event.lost for event in events if event.lost is not None]
+    drops = ", ".join(f"{reason}: {lost.count(reason)}" for reason in LOSS_REASONS)
+    return "\n".join(
+        [
+            f"input events: {len(events)} read: {sum(event.read is not None for event in events)} "
+            f"lost: {len(lost)} ({drops})",
+            describe_latency(
+                "handler entry latency",
+                [event.handler_entry - event.arrival for event in events if event.handler_entry is not None],
+            ),
+            describe_latency("in latency", [event.read - event.arrival for event in events if event.read is not None]),
+        ]
+    )
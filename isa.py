@@ -8,6 +8,12 @@ MIN_NUMBER = -(1 << 31)
 INT1_ADDRESS = 1
 INPUT_PORT_ADDRESS = 0
 OUTPUT_PORT_ADDRESS = 1
+TIMER_PORT_ADDRESS = 2
+HART_ID_PORT_ADDRESS = 3
+
+# Линии прерываний: чем меньше номер, тем выше приоритет
+INPUT_INTERRUPTION_LINE = 1
+TIMER_INTERRUPTION_LINE = 2
 
 DIRECTION_ADDRESS = 0
 INDERECTION_ADDRESS = 1
@@ -15,6 +21,18 @@ REGISTER_ADDRESS = 2
 NO_ADDRESS = 3
 PORT_ADDRESS = 4
 
+# Виды обращений к памяти (для профилирования)
+INSTRUCTION_FETCH = 0
+OPERAND_FETCH = 1
+DATA_READ = 2
+DATA_WRITE = 3
+
+# Длительность в тактах (см. таблицу в README)
+DECODE_TICKS = 1
+INITIALIZATION_TICKS = 3
+INTERRUPTION_ENTRY_TICKS = 3
+OPERAND_FETCH_TICKS = {DIRECTION_ADDRESS: 3, INDERECTION_ADDRESS: 4}
+
 
 class Opcode(str, enum.Enum):
     LOAD = "load"  # Загрузка значения из памяти в регистр
@@ -39,13 +57,57 @@ class Opcode(str, enum.Enum):
 
     HALT = "halt"  # Остановка выполнения программы
 
+    CAS = "cas"  # Атомарное сравнение с обменом
+
     IRET = "iret"  # Возврат из прерывания
+    WAIT = "wait"  # Ожидание прерывания
 
     def __str__(self):
         """`Opcode.INC` - `increment`."""
         return str(self.value)
 
 
+EXECUTION_TICKS = {
+    Opcode.HALT: 0,
+    Opcode.LOAD: 2,
+    Opcode.STORE: 2,
+    Opcode.ADD: 2,
+    Opcode.SUB: 2,
+    Opcode.MOD: 2,
+    Opcode.INC: 2,
+    Opcode.CMP: 1,
+    Opcode.JZ: 1,
+    Opcode.JNZ: 1,
+    Opcode.JMP: 1,
+    Opcode.MOVE: 2,
+    Opcode.IRET: 1,
+    Opcode.EI: 1,
+    Opcode.DI: 1,
+    Opcode.IN: 2,
+    Opcode.OUT: 2,
+    Opcode.WAIT: 1,
+    Opcode.CAS: 3,
+}
+
+MEMORY_OPCODES = (Opcode.LOAD, Opcode.STORE, Opcode.CAS)
+BRANCH_OPCODES = (Opcode.JZ, Opcode.JNZ, Opcode.JMP)
+
+
+def instruction_ticks(instr) -> int:
+    """Количество тактов на выполнение инструкции, включая выборку и операнд.
+
+    >>> instruction_ticks({"opcode": Opcode.LOAD, "addrType": INDERECTION_ADDRESS})
+    7
+    >>> instruction_ticks({"opcode": Opcode.JZ, "addrType": DIRECTION_ADDRESS})
+    2
+    """
+    opcode = Opcode(instr["opcode"])
+    ticks = DECODE_TICKS + EXECUTION_TICKS[opcode]
+    if opcode in MEMORY_OPCODES:
+        ticks += OPERAND_FETCH_TICKS[instr["addrType"]]
+    return ticks
+
+
 class Term(namedtuple("Term", "index related_label")):
     """Тип может быть:
     0 - прямая
@@ -56,6 +118,22 @@ class Term(namedtuple("Term", "index related_label")):
     """
 
 
+def collect_labels(code) -> dict:
+    """Восстановить имена меток по адресам из ссылок на них в `term`.
+
+    Сами метки в машинный код не попадают, поэтому имя известно только
+    у адресов, на которые ссылаются инструкции или ссылочные данные.
+    """
+    labels = {}
+    for instr in code:
+        if "term" not in instr or not instr["term"][1]:
+            continue
+        address = instr.get("op") if "opcode" in instr else instr.get("data")
+        if isinstance(address, int):
+            labels.setdefault(address, instr["term"][1])
+    return labels
+
+
 def write_code(filename, code):
     """Записать машинный код в файл."""
     with open(filename, "w", encoding="utf-8") as file:
@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""Компоновщик перемещаемых объектных файлов с кэшем сборки.
+
+Каждый модуль транслируется отдельно (`translator.translate_object`), а
+объектные файлы кэшируются по хэшу исходного текста: неизменившиеся модули
+повторно не транслируются.
+
+Раскладка памяти после компоновки:
+
+- ячейка `0` -- `jmp` на метку `.text` первого (главного) модуля;
+- секции `.text` всех модулей в порядке их перечисления;
+- секции `.data` всех модулей в том же порядке;
+- последняя ячейка -- вектор прерываний `int1`, `int2`, ... и точек входа ядер `hartN`.
+
+Метки модуля локальны. Видимыми из других модулей их делает директива
+`global <метка>`; метки обработчиков прерываний `.intN` и точек входа `.hartN` экспортируются неявно.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from isa import Term, write_code
+from translator import (
+    OBJECT_FORMAT_VERSION,
+    SECTION_LABELS,
+    interrupt_vector,
+    is_instruction_cell,
+    is_vector_label,
+    translate_object,
+)
+
+CACHE_DIRECTORY = ".build_cache"
+
+
+def read_object(filename: str) -> dict:
+    """Прочесть объектный файл"""
+    with open(filename, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_object(filename: str, obj: dict) -> None:
+    """Записать объектный файл"""
+    with open(filename, "w", encoding="utf-8") as file:
+        json.dump(obj, file)
+
+
+class BuildCache:
+    """Кэш объектных файлов, ключ -- хэш исходного текста и версии формата"""
+
+    directory: str = None
+    hits: int = None
+    misses: int = None
+
+    def __init__(self, directory: str = CACHE_DIRECTORY):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(f"{OBJECT_FORMAT_VERSION}\n{text}".encode()).hexdigest()
+
+    def assemble(self, source: str) -> dict:
+        """Объектный файл для исходника: из кэша или после трансляции"""
+        with open(source, encoding="utf-8") as f:
+            text = f.read()
+        path = os.path.join(self.directory, self.key(text) + ".o")
+        if Path(path).exists():
+            self.hits += 1
+            return read_object(path)
+        self.misses += 1
+        obj = translate_object(text)
+        write_object(path, obj)
+        return obj
+
+
+def layout(objects: list) -> dict:
+    """Адрес начала каждой секции каждого модуля: (модуль, секция) -> адрес"""
+    bases, address = {}, 1
+    for section in (".text", ".data"):
+        for module, obj in enumerate(objects):
+            bases[module, section] = address
+            address += len(obj["sections"][section])
+    return bases
+
+
+def symbol_address(obj: dict, bases: dict, module: int, symbol: str) -> int:
+    section, offset = obj["symbols"][symbol]
+    return bases[module, section] + offset
+
+
+def global_symbols(objects: list, bases: dict) -> dict:
+    """Таблица экспортированных меток всех модулей"""
+    symbols = {}
+    for module, obj in enumerate(objects):
+        exports = obj["exports"] + [name for name in obj["symbols"] if is_handler_symbol(obj, name)]
+        for name in exports:
+            if name not in obj["symbols"]:
+                raise UndefinedSymbolError(name)
+            if name in symbols:
+                raise DuplicateSymbolError(name)
+            symbols[name] = symbol_address(obj, bases, module, name)
+    return symbols
+
+
+def is_handler_symbol(obj: dict, name: str) -> bool:
+    """Метка обработчика или точки входа ядра (на инструкции), экспортируется неявно"""
+    section, offset = obj["symbols"][name]
+    return is_vector_label(name) and is_instruction_cell(obj["sections"][section], offset)
+
+
+def resolve(obj: dict, bases: dict, module: int, symbols: dict, symbol: str) -> int:
+    if symbol in obj["symbols"]:
+        return symbol_address(obj, bases, module, symbol)
+    if symbol in symbols:
+        return symbols[symbol]
+    raise UndefinedSymbolError(symbol)
+
+
+def relocate(obj: dict, bases: dict, module: int, symbols: dict) -> dict:
+    """Ячейки модуля с абсолютными адресами: секция -> список ячеек"""
+    sections = {section: [dict(cell) for cell in obj["sections"][section]] for section in SECTION_LABELS}
+    for relocation in obj["relocations"]:
+        cell = sections[relocation["section"]][relocation["index"]]
+        cell[relocation["field"]] = resolve(obj, bases, module, symbols, relocation["symbol"])
+    for section, cells in sections.items():
+        for offset, cell in enumerate(cells):
+            if "term" in cell:
+                cell["term"] = Term(bases[module, section] + offset, cell["term"][1])
+    return sections
+
+
+def link(objects: list) -> list:
+    """Собрать машинный код из объектных файлов. Первый модуль -- главный."""
+    assert objects, "Nothing to link"
+    bases = layout(objects)
+    symbols = global_symbols(objects, bases)
+    relocated = [relocate(obj, bases, module, symbols) for module, obj in enumerate(objects)]
+
+    if ".text" in objects[0]["symbols"]:
+        entry = symbol_address(objects[0], bases, 0, ".text")
+    else:
+        entry = bases[0, ".text"]
+    code = [{"opcode": "jmp", "op": entry, "addrType": 0, "term": Term(0, ".text")}]
+    for section in (".text", ".data"):
+        for sections in relocated:
+            code.extend(sections[section])
+    code.append(interrupt_vector(symbols, code))
+    return code
+
+
+def build(sources: list, target: str, cache: BuildCache) -> list:
+    """Транслировать изменившиеся модули, скомпоновать и записать результат"""
+    code = link([cache.assemble(source) for source in sources])
+    write_code(target, code)
+    return code
+
+
+def main(target: str, sources: list):
+    cache = BuildCache()
+    code = build(sources, target, cache)
+    print("modules:", len(sources), "assembled:", cache.misses, "cached:", cache.hits, "code instr:", len(code))
+
+
+class LinkError(ValueError):
+    pass
+
+
+class UndefinedSymbolError(LinkError):
+    def __init__(self, symbol):
+        super().__init__(f"Undefined symbol {symbol}")
+
+
+class DuplicateSymbolError(LinkError):
+    def __init__(self, symbol):
+        super().__init__(f"Symbol {symbol} is exported by several modules")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, "Wrong arguments: linker.py <target_file> <source_file> [<source_file> ...]"
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,79 @@
+"""Тесты раздельной трансляции, компоновщика и кэша сборки."""
+
+import linker
+import machine
+import pytest
+import translator
+
+MAIN_MODULE = """
+global .printed
+
+section .text:
+    move r3, #0
+    jmp .print_str
+    .printed:
+        halt
+"""
+
+PRINT_MODULE = """
+global .print_str
+global greeting
+
+section .data:
+    greeting: "Hi", 0
+    pointer: greeting
+
+section .text:
+    .print_str:
+        load r0, (pointer)
+        cmp r0, r3
+        jz .printed
+        out r0, 1
+        load r0, pointer
+        inc r0
+        store r0, pointer
+        jmp .print_str
+"""
+
+
+def test_object_file_keeps_references_relocatable():
+    obj = translator.translate_object(PRINT_MODULE)
+    assert obj["exports"] == [".print_str", "greeting"]
+    assert obj["imports"] == [".printed"]
+    assert obj["symbols"]["pointer"] == [".data", 3]
+    assert {"section": ".data", "index": 3, "field": "data", "symbol": "greeting"} in obj["relocations"]
+
+
+def test_linked_modules_run():
+    objects = [translator.translate_object(MAIN_MODULE), translator.translate_object(PRINT_MODULE)]
+    code = linker.link(objects)
+    output, _, _ = machine.simulation(code, [])
+    assert "".join(output) == "Hi"
+    assert code[-1] == {"int1": "-"}
+
+
+def test_interrupt_handlers_are_exported_implicitly():
+    handlers = translator.translate_object("section .text:\nint 2:\n    iret\n.int1:\n    iret\n")
+    code = linker.link([translator.translate_object(MAIN_MODULE), translator.translate_object(PRINT_MODULE), handlers])
+    vector = code[-1]
+    assert list(vector) == ["int1", "int2"]
+    assert vector["int1"] == vector["int2"] + 1
+    assert code[vector["int2"]]["opcode"] == "iret"
+
+
+def test_undefined_symbol():
+    with pytest.raises(linker.UndefinedSymbolError):
+        linker.link([translator.translate_object(MAIN_MODULE)])
+
+
+def test_cache_skips_unchanged_modules(tmp_path):
+    main_source, print_source = tmp_path / "main.asm", tmp_path / "print.asm"
+    main_source.write_text(MAIN_MODULE, encoding="utf-8")
+    print_source.write_text(PRINT_MODULE, encoding="utf-8")
+    sources, target = [str(main_source), str(print_source)], str(tmp_path / "out.json")
+
+    cache = linker.BuildCache(str(tmp_path / "cache"))
+    linker.build(sources, target, cache)
+    main_source.write_text(MAIN_MODULE + "\n    halt\n", encoding="utf-8")
+    linker.build(sources, target, cache)
+    assert (cache.misses, cache.hits) == (3, 1)
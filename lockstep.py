@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""Пошаговое сравнение эталонной модели и альтернативного движка.
+
+Эталон -- `ControlUnit` c тем же циклом, что в `simulation`. После каждой
+инструкции сравнивается архитектурное состояние: PC, регистры, флаг нуля,
+записи в память (адреса и значения), вывод, счётчик тактов и состояние
+прерываний. Если обе модели остановились с исключением одного типа,
+проверка заканчивается без сравнения: инструкция не завершилась, и её
+частичное состояние не архитектурное. О первом расхождении сообщается
+вместе с последними выполненными инструкциями.
+
+Программы и расписания ввода для проверки генерируются случайно из
+инструкций языка транслятора.
+
+Интерфейс командной строки: `lockstep.py [<cases> [<seed>]]`.
+"""
+
+import collections
+import random
+import sys
+
+from engine import Engine
+from isa import DATA_WRITE
+from machine import INSTRUCTION_LIMIT, ControlUnit, DataPath, execute_step
+from tracer import NullTraceSink
+from translator import translate
+
+CONTEXT_INSTRUCTIONS = 8
+CASE_INSTRUCTIONS = 500
+STATE_FIELDS = (
+    "pc",
+    "registers",
+    "zero_flag",
+    "tick_counter",
+    "writes",
+    "output",
+    "interruption_enabled",
+    "handling_interruption",
+)
+
+
+class WriteRecorder:
+    """Наблюдатель обращений к памяти эталонной модели: адреса записей"""
+
+    writes: list = None
+
+    def __init__(self):
+        self.writes = []
+
+    def record(self, address: int, access: int) -> None:
+        if access == DATA_WRITE:
+            self.writes.append(address)
+
+
+class ReferenceMachine:
+    """`ControlUnit` с шагом по инструкции и состоянием в форме `Engine`"""
+
+    data_path: DataPath = None
+    control_unit: ControlUnit = None
+    recorder: WriteRecorder = None
+    input_tokens: list = None
+
+    def __init__(self, code: list, input_tokens: list, nested: bool = False):
+        self.data_path = DataPath(code)
+        self.data_path.interruption_controller.nested = nested
+        self.control_unit = ControlUnit(self.data_path, NullTraceSink())
+        self.recorder = WriteRecorder()
+        self.data_path.add_memory_observer(self.recorder)
+        self.input_tokens = input_tokens
+
+    def initialization_cycle(self) -> None:
+        self.control_unit.initialization_cycle()
+
+    def step(self) -> None:
+        self.input_tokens = execute_step(self.control_unit, self.input_tokens)
+
+    def state(self) -> dict:
+        data_path, control_unit = self.data_path, self.control_unit
+        writes = [(address, data_path.memory[address]) for address in self.recorder.writes]
+        self.recorder.writes.clear()
+        return {
+            "pc": data_path.pc,
+            "registers": list(data_path.register_file.registers),
+            "zero_flag": int(data_path.alu.zero_flag),
+            "tick_counter": control_unit.tick_counter,
+            "writes": writes,
+            "output": "".join(data_path.port_manager.output_buffer),
+            "interruption_enabled": control_unit.interruption_enabled,
+            "handling_interruption": control_unit.handling_interruption,
+        }
+
+
+def engine_state(engine: Engine) -> dict:
+    writes = [(address, engine.memory[address]) for address in engine.writes]
+    engine.writes.clear()
+    return {
+        "pc": engine.pc,
+        "registers": list(engine.registers),
+        "zero_flag": engine.zero_flag,
+        "tick_counter": engine.tick_counter,
+        "writes": writes,
+        "output": "".join(engine.output_buffer),
+        "interruption_enabled": engine.interruption_enabled,
+        "handling_interruption": engine.handling_interruption,
+    }
+
+
+def outcome(action) -> str | None:
+    """Исход шага: `None`, `halt` или имя типа исключения"""
+    try:
+        action()
+    except StopIteration:
+        return "halt"
+    except Exception as e:
+        return type(e).__name__
+    return None
+
+
+class Divergence:
+    instruction: int = None
+    field: str = None
+    reference = None
+    alternative = None
+    context: list = None
+
+    def __init__(self, instruction: int, field: str, reference, alternative, context: list):
+        self.instruction = instruction
+        self.field = field
+        self.reference = reference
+        self.alternative = alternative
+        self.context = context
+
+    def describe(self) -> str:
+        lines = [
+            f"divergence after instruction {self.instruction}: {self.field}",
+            f"  reference:   {self.reference}",
+            f"  alternative: {self.alternative}",
+            "last instructions (reference):",
+        ]
+        lines.extend(f"  {number:>6} @{pc:<5} {instruction}" for number, pc, instruction in self.context)
+        return "\n".join(lines)
+
+
+def first_difference(reference: dict, alternative: dict) -> str | None:
+    for field in STATE_FIELDS:
+        if reference[field] != alternative[field]:
+            return field
+    return None
+
+
+def describe_instruction(cell) -> str:
+    if not isinstance(cell, dict) or "opcode" not in cell:
+        return str(cell)
+    operands = ", ".join(f"{key}={cell[key]}" for key in ("reg", "op", "op1", "op2", "op3") if key in cell)
+    return f"{cell['opcode']} {operands}".strip()
+
+
+def check(
+    code: list, input_tokens: list, engine_class=Engine, limit: int = INSTRUCTION_LIMIT, nested: bool = False
+) -> Divergence | None:
+    """Выполнить программу обеими моделями по инструкциям до первого расхождения"""
+    reference = ReferenceMachine(code, list(input_tokens), nested)
+    alternative = engine_class(code, list(input_tokens), nested)
+    alternative.writes = []
+    context = collections.deque(maxlen=CONTEXT_INSTRUCTIONS)
+    instruction, actions = 1, (reference.initialization_cycle, alternative.initialization_cycle)
+    while True:
+        results = [outcome(action) for action in actions]
+        if results[0] != results[1]:
+            return Divergence(instruction, "outcome", *results, list(context))
+        if results[0] not in (None, "halt"):
+            return None
+        states = (reference.state(), engine_state(alternative))
+        field = first_difference(*states)
+        if field is not None:
+            return Divergence(instruction, field, *(state[field] for state in states), list(context))
+        if results[0] is not None or instruction >= limit:
+            return None
+        pc = reference.data_path.pc
+        context.append((instruction + 1, pc, describe_instruction(reference.data_path.memory[pc])))
+        instruction, actions = instruction + 1, (reference.step, alternative.step)
+
+
+REGISTERS = [f"r{number}" for number in range(12)]
+DATA_LABELS = ["d0", "d1", "d2", "d3"]
+POINTER_LABELS = ["p0", "p1"]
+
+
+def random_instruction(rng: random.Random, labels: list) -> str:
+    reg = rng.choice
+    generators = [
+        lambda: f"load {reg(REGISTERS)}, {reg(DATA_LABELS)}",
+        lambda: f"load {reg(REGISTERS)}, ({reg(POINTER_LABELS)})",
+        lambda: f"store {reg(REGISTERS)}, {reg(DATA_LABELS)}",
+        lambda: f"store {reg(REGISTERS)}, ({reg(POINTER_LABELS)})",
+        lambda: f"{reg(['add', 'sub', 'mod'])} {reg(REGISTERS)}, {reg(REGISTERS)}, {reg(REGISTERS)}",
+        lambda: f"inc {reg(REGISTERS)}",
+        lambda: f"cmp {reg(REGISTERS)}, {reg(REGISTERS)}",
+        lambda: f"{reg(['jz', 'jnz', 'jmp'])} {reg(labels)}",
+        lambda: f"move {reg(REGISTERS)}, #{rng.randint(0, 127)}",
+        lambda: f"move {reg(REGISTERS)}, {reg(REGISTERS)}",
+        lambda: reg(["ei", "di"]),
+        lambda: f"out {reg(REGISTERS)}, 1",
+        lambda: f"in {reg(REGISTERS)}, {reg([0, 3])}",
+        lambda: f"out {reg(REGISTERS)}, 2",
+        lambda: "wait",
+        lambda: f"cas {reg(REGISTERS)}, {reg(REGISTERS)}, {reg(DATA_LABELS + [f'({p})' for p in POINTER_LABELS])}",
+        lambda: "halt",
+    ]
+    weights = [3, 2, 3, 1, 4, 3, 3, 3, 4, 2, 1, 2, 1, 1, 1, 2, 1]
+    return rng.choices(generators, weights)[0]()
+
+
+def random_program(rng: random.Random, length: int = 24) -> str:
+    """Случайная программа: данные, указатели на них, ненулевые регистры, код с метками и, возможно, обработчики"""
+    labels = [f".l{number}" for number in range(max(length // 4, 1))]
+    places = dict(zip(rng.sample(range(length), len(labels)), labels, strict=True))
+    lines = ["section .data:"]
+    lines += [f"    {label}: {rng.randint(0, 127)}" for label in DATA_LABELS]
+    lines += [f"    {label}: {rng.choice(DATA_LABELS)}" for label in POINTER_LABELS]
+    lines.append("section .text:")
+    lines += [f"        move {register}, #{rng.randint(1, 127)}" for register in REGISTERS]
+    for number in range(length):
+        if number in places:
+            lines.append(f"    {places[number]}:")
+        lines.append(f"        {random_instruction(rng, labels)}")
+    lines.append("        halt")
+    if rng.random() < 0.7:
+        lines += [".int1:", "    in r11, 0", "    out r11, 1", "    iret"]
+    if rng.random() < 0.5:
+        lines += [".int2:", "    inc r10", "    iret"]
+    return "\n".join(lines)
+
+
+def random_input(rng: random.Random) -> list:
+    ticks = sorted(rng.sample(range(1, 400), rng.randint(0, 6)))
+    return [(tick, chr(rng.randint(ord("a"), ord("z")))) for tick in ticks]
+
+
+def main(cases: int = 1000, seed: int = 0):
+    rng = random.Random(seed)
+    for case in range(cases):
+        source, input_tokens = random_program(rng), random_input(rng)
+        nested = rng.random() < 0.5
+        divergence = check(translate(source), input_tokens, limit=CASE_INSTRUCTIONS, nested=nested)
+        if divergence is not None:
+            print(
+                f"case {case} (seed {seed}, nested {nested}), input: {input_tokens}\n{source}\n\n{divergence.describe()}"
+            )
+            sys.exit(1)
+    print(f"cases: {cases} seed: {seed} divergences: 0")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) <= 3, "Wrong arguments: lockstep.py [<cases> [<seed>]]"
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,45 @@
+"""Тесты быстрого движка и пошагового сравнения с эталонной моделью."""
+
+import random
+from pathlib import Path
+
+import engine
+import lockstep
+import machine
+import pytest
+import translator
+
+EXAMPLES_INPUT = [(0, "A"), (100, "l"), (200, "e"), (300, "x"), (600, "0")]
+
+
+@pytest.mark.parametrize("name", ["hello_world", "cat", "hello_username", "prob1"])
+def test_engine_matches_reference_on_examples(name):
+    code = translator.translate(Path("examples", f"{name}.asm").read_text(encoding="utf-8"))
+    assert lockstep.check(code, EXAMPLES_INPUT) is None
+    assert engine.run(code, EXAMPLES_INPUT) == machine.simulation(code, EXAMPLES_INPUT)
+
+
+def test_random_programs_do_not_diverge():
+    rng = random.Random(2024)
+    for _ in range(30):
+        code = translator.translate(lockstep.random_program(rng))
+        assert lockstep.check(code, lockstep.random_input(rng), limit=300) is None
+
+
+class SlowCmpEngine(engine.Engine):
+    def decode_cmp(self, cell: dict):
+        execute = super().decode_cmp(cell)
+
+        def slow():
+            execute()
+            self.tick_counter += 1
+
+        return slow
+
+
+def test_first_divergence_is_reported_with_context():
+    code = translator.translate("section .text:\n    move r0, #1\n    move r1, #2\n    cmp r0, r1\n    halt")
+    divergence = lockstep.check(code, [], SlowCmpEngine)
+    assert (divergence.instruction, divergence.field) == (4, "tick_counter")
+    assert divergence.reference + 1 == divergence.alternative
+    assert divergence.context[-1][2] == "cmp op1=0, op2=1"
@@ -1,20 +1,33 @@
 #!/usr/bin/python3
 
+import argparse
 import logging
-import sys
 
+from interrupt_stats import InterruptStats
+from interrupt_stats import summary as interrupt_summary
 from isa import (
+    DATA_READ,
+    DATA_WRITE,
     DIRECTION_ADDRESS,
+    HART_ID_PORT_ADDRESS,
     INDERECTION_ADDRESS,
+    INPUT_INTERRUPTION_LINE,
     INPUT_PORT_ADDRESS,
+    INSTRUCTION_FETCH,
     MAX_NUMBER,
     MEMORY_SIZE,
     MIN_NUMBER,
+    OPERAND_FETCH,
     OUTPUT_PORT_ADDRESS,
     REGISTER_ADDRESS,
+    TIMER_INTERRUPTION_LINE,
+    TIMER_PORT_ADDRESS,
     Opcode,
     read_code,
 )
+from memory_profile import MemoryProfile, summary
+from metrics import Metrics, create_metrics
+from tracer import FlightRecorder, TextTraceSink, TraceSink, open_trace_sink
 
 INSTRUCTION_LIMIT = 20000
 
@@ -30,84 +43,79 @@ ALU_OPCODE_SINGLE_HANDLERS = {
 }
 
 
+REGISTERS_COUNT = 16
+IR_REGISTER = 14
+IPC_REGISTER = 15
+# Номера регистров, доступные для защёлкивания и на левом выходе (ir -- только на правом)
+LATCHABLE_REGISTERS = frozenset(number for number in range(REGISTERS_COUNT) if number != IR_REGISTER)
+RIGHT_OUT_REGISTERS = frozenset(range(REGISTERS_COUNT))
+
+
+class Register:
+    """Доступ к регистру по имени (r0..r12, ar, ipc) для журнала и отладки"""
+
+    __slots__ = ("number",)
+
+    def __init__(self, number: int):
+        self.number = number
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return instance.registers[self.number]
+
+    def __set__(self, instance, value) -> None:
+        instance.registers[self.number] = value
+
+
 class RegistersFile:
-    r0: int = None
-    r1: int = None
-    r2: int = None
-    r3: int = None
-    r4: int = None
-    r5: int = None
-    r6: int = None
-    r7: int = None
-    r8: int = None
-    r9: int = None
-    r10: int = None
-    r11: int = None
-    r12: int = None
-    ar: int = None  # 13
-    ir: dict = None  # 14
-    ipc: int = None  # 15
-
-    left_out: int = None
-    right_out = None
+    __slots__ = ("ir", "left_out", "registers", "right_out")
+
+    r0 = Register(0)
+    r1 = Register(1)
+    r2 = Register(2)
+    r3 = Register(3)
+    r4 = Register(4)
+    r5 = Register(5)
+    r6 = Register(6)
+    r7 = Register(7)
+    r8 = Register(8)
+    r9 = Register(9)
+    r10 = Register(10)
+    r11 = Register(11)
+    r12 = Register(12)
+    ar = Register(13)
+    ipc = Register(IPC_REGISTER)
 
     def __init__(self):
-        self.r0 = 0
-        self.r1 = 0
-        self.r2 = 0
-        self.r3 = 0
-        self.r4 = 0
-        self.r5 = 0
-        self.r6 = 0
-        self.r7 = 0
-        self.r8 = 0
-        self.r9 = 0
-        self.r10 = 0
-        self.r11 = 0
-        self.r12 = 0
-        self.ar = 0  # 13
-        self.ir = {}  # 14
-        self.ipc = 0  # 15
+        self.registers = [0] * REGISTERS_COUNT
+        self.ir = {}  # 14, дублируется в registers для выбора по номеру
+        self.registers[IR_REGISTER] = self.ir
         self.left_out: int = 0
+        self.right_out = None
 
     def latch_reg_n(self, number: int, value: int) -> None:
         """Выбор регистра, в который защёлкнется значение"""
-        if 0 <= number <= 12:
-            setattr(self, f"r{number}", value)
-        elif number == 13:
-            self.ar = value
-        elif number == 15:
-            self.ipc = value
-        else:
+        if number not in LATCHABLE_REGISTERS:
             raise InvalidRegisterNumberError()
+        self.registers[number] = value
 
     def latch_reg_ir(self, instruction) -> None:
         """Защёлкивание в регистр инструкции"""
         self.ir = instruction
+        self.registers[IR_REGISTER] = instruction
 
     def sel_left_reg(self, number: int) -> None:
         """Выбор регистра, который поступит на левый выход"""
-        if 0 <= number <= 12:
-            self.left_out = getattr(self, f"r{number}")
-        elif number == 13:
-            self.left_out = self.ar
-        elif number == 15:
-            self.left_out = self.ipc
-        else:
+        if number not in LATCHABLE_REGISTERS:
             raise InvalidRegisterNumberError()
+        self.left_out = self.registers[number]
 
     def sel_right_reg(self, number: int) -> None:
         """Выбор регистра значение, который поступит на правый выход"""
-        if 0 <= number <= 12:
-            self.right_out = getattr(self, f"r{number}")
-        elif number == 13:
-            self.right_out = self.ar
-        elif number == 14:
-            self.right_out = self.ir
-        elif number == 15:
-            self.right_out = self.ipc
-        else:
+        if number not in RIGHT_OUT_REGISTERS:
             raise InvalidRegisterNumberError()
+        self.right_out = self.registers[number]
 
 
 class Alu:
@@ -157,16 +165,73 @@ class Alu:
 
 
 class InterruptionController:
+    """Запросы прерываний по линиям с приоритетами: чем меньше номер линии, тем выше приоритет.
+
+    Запрос линии снимается командой `iret` её обработчика. При `nested` обработчик
+    может быть прерван запросом более приоритетной линии; адрес возврата
+    прерванного обработчика (`r12`) сохраняется в `return_stack`.
+    """
+
     interruption: bool = None
     interruption_address: int = None
+    pending: int = None
+    in_service: list = None
+    return_stack: list = None
+    nested: bool = None
+    taken: int = None
 
-    def __init__(self):
+    def __init__(self, nested: bool = False):
         self.interruption = False
         self.interruption_address = 0
+        self.pending = 0
+        self.in_service = []
+        self.return_stack = []
+        self.nested = nested
+        self.taken = 0
 
-    def generate_interruption(self, number: int) -> None:
+    def generate_interruption(self, number: int, line: int = INPUT_INTERRUPTION_LINE) -> None:
         self.interruption = True
         self.interruption_address = number
+        self.pending |= 1 << line
+
+    def next_line(self) -> int | None:
+        """Линия запроса, который можно обслужить сейчас"""
+        if not self.pending:
+            return None
+        line = (self.pending & -self.pending).bit_length() - 1
+        if not self.in_service or (self.nested and line < self.in_service[-1]):
+            return line
+        return None
+
+    def complete(self) -> None:
+        """Снять запрос обслуженной линии; `iret` вне обработчика снимает все запросы"""
+        if self.in_service:
+            self.pending &= ~(1 << self.in_service.pop())
+        else:
+            self.pending = 0
+        self.interruption = self.pending != 0
+
+
+class Timer:
+    """Запрос прерывания по линии таймера каждые `period` тактов. Период задаётся `out` в порт 2, 0 -- выключен."""
+
+    period: int = None
+    next_tick: int = None
+
+    def __init__(self):
+        self.period = 0
+        self.next_tick = None
+
+    def program(self, period: int, tick: int) -> None:
+        self.period = period
+        self.next_tick = tick + period if period > 0 else None
+
+    def poll(self, tick: int) -> bool:
+        """Наступил ли срок; пропущенные периоды сливаются в один запрос"""
+        if self.next_tick is None or tick < self.next_tick:
+            return False
+        self.next_tick += self.period * ((tick - self.next_tick) // self.period + 1)
+        return True
 
 
 class PortManager:
@@ -201,20 +266,49 @@ class DataPath:
     alu: Alu = None
     interruption_controller: InterruptionController = None
     port_manager: PortManager = None
-
-    def __init__(self, memory):
+    timer: Timer = None
+    hart_id: int = None
+    # Наблюдатели обращений к памяти (профиль, точки наблюдения отладчика, счётчики): метод `record(address, access)`
+    memory_observers: list = None
+
+    def __init__(
+        self,
+        code: list | None = None,
+        *,
+        memory: list | None = None,
+        shared_memory: list | None = None,
+        hart_id: int = 0,
+    ):
+        """Память с загруженным `code` или `shared_memory` -- память другого тракта данных (ядра), общая с ним.
+
+        `memory` -- готовый массив на `MEMORY_SIZE` ячеек для `code` (пул памяти сервиса), ячейки вне программы
+        в нём уже должны быть обнулены.
+        """
+        if (code is None) == (shared_memory is None) or (memory is not None and shared_memory is not None):
+            raise DataPathMemoryError()
         self.register_file = RegistersFile()
         self.pc = 0
 
-        self.memory = [0] * MEMORY_SIZE
-        for i in range(len(memory) - 1):
-            self.memory[i] = memory[i]
+        if shared_memory is None:
+            self.memory = [0] * MEMORY_SIZE if memory is None else memory
+            self.memory[: len(code) - 1] = code[:-1]
+            self.memory[-1] = code[-1]
+        else:
+            self.memory = shared_memory
         self.memory_size = MEMORY_SIZE
-        self.memory[-1] = memory[-1]
+        self.hart_id = hart_id
         self.alu = Alu()
         self.interruption_controller = InterruptionController()
 
         self.port_manager = PortManager()
+        self.timer = Timer()
+        self.memory_observers = []
+
+    def add_memory_observer(self, observer) -> None:
+        self.memory_observers.append(observer)
+
+    def remove_memory_observer(self, observer) -> None:
+        self.memory_observers.remove(observer)
 
     def signal_latch_pc(self, value: int) -> None:
         """Защёлкнуть значение в Program Counter"""
@@ -223,11 +317,15 @@ class DataPath:
     def signal_write_memory(self, address: int, value: int) -> None:
         """Записать значение в память"""
         assert address < self.memory_size, f"Memory doesn't have cell with index {address}"
+        for observer in self.memory_observers:
+            observer.record(address, DATA_WRITE)
         self.memory[address] = {"data": value}
 
-    def signal_read_memory(self, address: int):
-        """Прочитать значение из памяти"""
+    def signal_read_memory(self, address: int, access: int = DATA_READ):
+        """Прочитать значение из памяти. `access` -- вид обращения для профилировщика"""
         assert address < self.memory_size, f"Memory doesn't have cell with index {address}"
+        for observer in self.memory_observers:
+            observer.record(address, access)
         return self.memory[address]
 
 
@@ -238,6 +336,11 @@ class ControlUnit:
 
     handling_interruption: bool = None
 
+    waiting: bool = None
+
+    # Слияние идиом в макрооперации (`cmp`+`jz`/`jnz`, `load`+`inc`+`store`)
+    fusion: bool = None
+
     data_path: DataPath = None
 
     current_instruction: Opcode = None
@@ -246,10 +349,19 @@ class ControlUnit:
 
     instruction_executors = None
 
-    def __init__(self, data_path: DataPath):
+    trace: TraceSink = None
+
+    interrupt_stats = None
+
+    metrics = None
+
+    def __init__(self, data_path: DataPath, trace_sink: TraceSink | None = None):
         self.tick_counter = 0
+        self.trace = TextTraceSink() if trace_sink is None else trace_sink
         self.interruption_enabled = False
         self.handling_interruption = False
+        self.waiting = False
+        self.fusion = False
         self.data_path = data_path
         self.instruction_executors = {
             Opcode.LOAD: self.execute_load,
@@ -269,56 +381,43 @@ class ControlUnit:
             Opcode.MOVE: self.execute_move,
             Opcode.HALT: self.execute_halt,
             Opcode.IRET: self.execute_iret,
+            Opcode.WAIT: self.execute_wait,
+            Opcode.CAS: self.execute_cas,
         }
 
     def tick(self, interpr: str):
         self.tick_counter += 1
-        registers_repr = "\n\tTICK: {:3} PC: {:3} Z_FLAG: {:3} \n\tr0: {:2}|  r1: {:2}|  r2: {:2}| r3: {:2}| r4: {:2}| r5: {:2}| r6: {:2}| r7: {:2}| r8: {:2}| r9: {:2}| r10: {:2}| r11: {:2}| r12: {:2}| ar: {:2}| ir: {:2}| ipc: {:2}| ".format(
-            str(self.tick_counter),
-            str(self.data_path.pc),
-            int(self.data_path.alu.zero_flag),
-            str(self.data_path.register_file.r0),
-            str(self.data_path.register_file.r1),
-            str(self.data_path.register_file.r2),
-            str(self.data_path.register_file.r3),
-            str(self.data_path.register_file.r4),
-            str(self.data_path.register_file.r5),
-            str(self.data_path.register_file.r6),
-            str(self.data_path.register_file.r7),
-            str(self.data_path.register_file.r8),
-            str(self.data_path.register_file.r9),
-            str(self.data_path.register_file.r10),
-            str(self.data_path.register_file.r11),
-            str(self.data_path.register_file.r12),
-            str(self.data_path.register_file.ar),
-            str(self.data_path.register_file.ir.get("opcode")),
-            str(self.data_path.register_file.ipc),
-        )
-
-        ports = "|PORT_0: {} |".format(self.data_path.port_manager.port_0) + "PORT_1: {}|".format(
-            self.data_path.port_manager.port_1
-        )
-        inter = "CONTROLLER_INT: {}".format(self.data_path.interruption_controller.interruption)
-        if self.data_path.interruption_controller.interruption:
-            addr_int_vec = " | INT_VECTOR_ADDR: {} |".format(
-                self.data_path.interruption_controller.interruption_address
-            )
-            inter_cu = " INT_ENABLED: {} |".format(self.interruption_enabled)
-            handling_int = " INT_HANDLING: {} |".format(self.handling_interruption)
-            inter = inter + addr_int_vec + inter_cu + handling_int
-        instruction_repr = self.current_instruction
-
+        if self.trace.active:
+            self.trace.tick(self.snapshot(interpr))
+
+    def snapshot(self, interpr: str) -> tuple:
+        """Состояние машины на текущем такте в порядке `tracer.TRACE_FIELDS`"""
+        registers = self.data_path.register_file
+        interruption_controller = self.data_path.interruption_controller
+        instruction_repr = str(self.current_instruction)
         if self.current_operand is not None:
             instruction_repr += " {}".format(self.current_operand)
 
-        logging.debug(
-            "{} {} | \t[instruction: {} #{}] {} \n \t{} ".format(
-                registers_repr, interpr, instruction_repr, self.data_path.register_file.ir.get("term")[0], ports, inter
-            )
+        return (
+            self.tick_counter,
+            self.data_path.pc,
+            int(self.data_path.alu.zero_flag),
+            *registers.registers[:IR_REGISTER],
+            registers.registers[IPC_REGISTER],
+            str(registers.ir.get("opcode")),
+            instruction_repr,
+            registers.ir.get("term")[0],
+            self.data_path.port_manager.port_0,
+            self.data_path.port_manager.port_1,
+            interruption_controller.interruption,
+            interruption_controller.interruption_address,
+            self.interruption_enabled,
+            self.handling_interruption,
+            interpr,
         )
 
     def initialization_cycle(self):
-        data_out = self.data_path.signal_read_memory(self.data_path.pc)
+        data_out = self.data_path.signal_read_memory(self.data_path.pc, INSTRUCTION_FETCH)
         self.current_instruction = Opcode(data_out.get("opcode"))
         self.data_path.register_file.latch_reg_ir(data_out)
         self.tick("MEM(PC) -> IR")
@@ -334,13 +433,74 @@ class ControlUnit:
         self.tick("0 + AR -> PC")
 
     def decode_and_execute_instruction(self):
-        data_out = self.data_path.signal_read_memory(self.data_path.pc)
+        data_out = self.data_path.signal_read_memory(self.data_path.pc, INSTRUCTION_FETCH)
         self.current_instruction = Opcode(data_out.get("opcode"))
         self.data_path.register_file.latch_reg_ir(data_out)
         self.tick("MEM[PC] -> IR")
+        if self.metrics is not None:
+            self.metrics.instruction(self.current_instruction)
         instruction_executor = self.instruction_executors[self.current_instruction]
+        if self.fusion:
+            instruction_executor = self.fused_executor(data_out) or instruction_executor
         instruction_executor()
 
+    def fused_executor(self, instruction: dict):
+        """Исполнитель макрооперации, которую `instruction` начинает вместе со следующими ячейками, или `None`.
+
+        Следующие ячейки декодер видит в буфере выборки, отдельных тактов выборки для них нет. Наблюдателям
+        памяти они передаются как выборка инструкций, когда макрооперация исполняется.
+        """
+        pc = self.data_path.pc
+        second, third = [*self.data_path.memory[pc + 1 : pc + 3], None, None][:2]
+        if instruction.get("opcode") == Opcode.CMP and is_instruction(second, Opcode.JZ, Opcode.JNZ):
+            return self.execute_cmp_branch
+        if is_increment_idiom(instruction, second, third):
+            return self.execute_increment
+        return None
+
+    def execute_cmp_branch(self):
+        """`cmp` и следующий `jz`/`jnz` одной макрооперацией, без такта выборки перехода"""
+        branch = self.data_path.signal_read_memory(self.data_path.pc + 1, INSTRUCTION_FETCH)
+        if self.metrics is not None:
+            self.metrics.fused(Opcode(branch["opcode"]))
+        if self.trace.active:
+            self.trace.event("fused: cmp + " + branch["opcode"])
+        self.execute_cmp()
+        self.current_instruction = Opcode(branch["opcode"])
+        self.data_path.register_file.latch_reg_ir(branch)
+        self.instruction_executors[self.current_instruction]()
+
+    def execute_increment(self):
+        """`load r, p; inc r; store r, p` одной макрооперацией: чтение с прибавлением единицы на АЛУ и запись.
+
+        `IPC` после неё -- адрес `load`, а не `store`.
+        """
+        pc = self.data_path.pc
+        self.data_path.signal_read_memory(pc + 1, INSTRUCTION_FETCH)
+        store = self.data_path.signal_read_memory(pc + 2, INSTRUCTION_FETCH)
+        if self.metrics is not None:
+            self.metrics.fused(Opcode.INC, Opcode.STORE)
+        if self.trace.active:
+            self.trace.event("fused: load + inc + store")
+        reg = self.data_path.register_file.ir.get("reg")
+        self.operand_fetch()
+
+        data_out = self.data_path.signal_read_memory(self.data_path.pc).get("data")
+        self.data_path.register_file.latch_reg_n(reg, self.data_path.alu.perform(1, data_out, Opcode.ADD))
+        self.tick("1 + MEM[PC] -> R" + str(reg))
+
+        self.current_instruction = Opcode.STORE
+        self.data_path.register_file.latch_reg_ir(store)
+        self.data_path.register_file.sel_right_reg(reg)
+        self.data_path.signal_write_memory(self.data_path.pc, self.data_path.register_file.right_out)
+        self.tick("R" + str(reg) + " -> MEM[PC]")
+
+        self.data_path.register_file.sel_right_reg(15)
+        self.data_path.signal_latch_pc(
+            self.data_path.alu.perform(3, self.data_path.register_file.right_out, Opcode("add"))
+        )
+        self.tick("3 + IPC -> PC")
+
     def execute_halt(self):
         raise StopIteration()
 
@@ -360,7 +520,7 @@ class ControlUnit:
             )
 
             self.data_path.register_file.latch_reg_n(
-                13, self.data_path.signal_read_memory(self.data_path.pc).get("data")
+                13, self.data_path.signal_read_memory(self.data_path.pc, OPERAND_FETCH).get("data")
             )
             self.tick("0 + AR -> PC; MEM[PC] - > AR")
             self.data_path.register_file.sel_right_reg(13)
@@ -404,6 +564,36 @@ class ControlUnit:
         )
         self.tick("1 + IPC -> PC")
 
+    def execute_cas(self):
+        """Сравнение с обменом за одну инструкцию, поэтому атомарно и при нескольких ядрах.
+
+        Флаг нуля -- успех; при неудаче в регистр `reg` попадает текущее значение ячейки.
+        Возврат `IPC + 1 -> PC` идёт мимо АЛУ, чтобы не затереть флаг.
+        """
+        self.operand_fetch()
+
+        reg, new = self.data_path.register_file.ir.get("reg"), self.data_path.register_file.ir.get("op1")
+        self.data_path.register_file.sel_right_reg(reg)
+        self.data_path.alu.perform(
+            self.data_path.signal_read_memory(self.data_path.pc).get("data"),
+            self.data_path.register_file.right_out,
+            Opcode.SUB,
+        )
+        self.tick("MEM[PC] - R" + str(reg) + " --> ZERO FLAG")
+
+        if self.data_path.alu.zero_flag == 1:
+            self.data_path.register_file.sel_right_reg(new)
+            self.data_path.signal_write_memory(self.data_path.pc, self.data_path.register_file.right_out)
+            self.tick("R" + str(new) + " -> MEM[PC]")
+        else:
+            self.data_path.register_file.latch_reg_n(
+                reg, self.data_path.signal_read_memory(self.data_path.pc).get("data")
+            )
+            self.tick("MEM[PC] -> R" + str(reg))
+
+        self.data_path.signal_latch_pc(self.data_path.register_file.ipc + 1)
+        self.tick("IPC + 1 -> PC")
+
     def execute_binary_math_instruction(self):
         self.data_path.register_file.sel_left_reg(self.data_path.register_file.ir.get("op2"))
         self.data_path.register_file.sel_right_reg(self.data_path.register_file.ir.get("op3"))
@@ -513,14 +703,29 @@ class ControlUnit:
         self.tick("PC + 1 -> PC")
 
     def execute_iret(self):
-        self.handling_interruption = False
-        self.data_path.interruption_controller.interruption = False
+        interruption_controller = self.data_path.interruption_controller
+        interruption_controller.complete()
+        self.handling_interruption = bool(interruption_controller.in_service)
         self.data_path.register_file.sel_right_reg(12)
         self.data_path.signal_latch_pc(
             self.data_path.alu.perform(0, self.data_path.register_file.right_out, Opcode.ADD)
         )
+        if interruption_controller.in_service:
+            self.data_path.register_file.latch_reg_n(12, interruption_controller.return_stack.pop())
         self.tick("R12 -> PC")
 
+    def execute_wait(self):
+        self.waiting = True
+        self.data_path.signal_latch_pc(self.data_path.pc + 1)
+        self.tick("WAIT; PC + 1 -> PC")
+
+    def idle(self, ticks: int) -> None:
+        """Пропустить такты простоя по `wait` без снимков состояния"""
+        if ticks > 0:
+            self.tick_counter += ticks
+            if self.trace.active:
+                self.trace.event(f"IDLE {ticks} TICKS")
+
     def execute_ei(self):
         self.interruption_enabled = True
         self.data_path.signal_latch_pc(self.data_path.pc + 1)
@@ -532,18 +737,25 @@ class ControlUnit:
         self.tick("INT_ON; PC + 1 -> PC")
 
     def execute_in(self):
-        logging.debug("input: %s", repr(chr(self.data_path.port_manager.port_0)))
+        if self.trace.active:
+            self.trace.event("input: {}".format(repr(chr(self.data_path.port_manager.port_0))))
         self.data_path.register_file.sel_right_reg(14)
         port = self.data_path.alu.cut_operand(self.data_path.register_file.right_out)
         self.data_path.register_file.latch_reg_n(13, port)
         self.tick("IR(OPERAND) -> AR")
 
         if port == INPUT_PORT_ADDRESS:
+            if self.interrupt_stats is not None:
+                self.interrupt_stats.read()
             self.data_path.register_file.latch_reg_n(
                 self.data_path.register_file.ir.get("reg"), self.data_path.port_manager.port_0
             )
             self.data_path.signal_latch_pc(self.data_path.pc + 1)
             self.tick("PORT_0 -> R" + str(self.data_path.register_file.ir.get("reg")) + "; PC + 1 -> PC")
+        elif port == HART_ID_PORT_ADDRESS:
+            self.data_path.register_file.latch_reg_n(self.data_path.register_file.ir.get("reg"), self.data_path.hart_id)
+            self.data_path.signal_latch_pc(self.data_path.pc + 1)
+            self.tick("HART_ID -> R" + str(self.data_path.register_file.ir.get("reg")) + "; PC + 1 -> PC")
         else:
             raise InvalidInputPortNumberError()
 
@@ -558,14 +770,24 @@ class ControlUnit:
             self.data_path.port_manager.port_1 = self.data_path.alu.perform(
                 0, self.data_path.register_file.right_out, Opcode.ADD
             )
-            logging.debug(
-                "output: %s << %s",
-                repr("".join(self.data_path.port_manager.output_buffer)),
-                repr(chr(self.data_path.port_manager.port_1)),
-            )
+            if self.trace.active:
+                self.trace.event(
+                    "output: {} << {}".format(
+                        repr("".join(self.data_path.port_manager.output_buffer)),
+                        repr(chr(self.data_path.port_manager.port_1)),
+                    )
+                )
             self.data_path.port_manager.write_buffer()
             self.data_path.signal_latch_pc(self.data_path.pc + 1)
             self.tick("R" + str(self.data_path.register_file.ir.get("reg")) + " + 0 -> PORT_1; PC + 1 -> PC")
+        elif port == TIMER_PORT_ADDRESS:
+            self.data_path.register_file.sel_right_reg(self.data_path.register_file.ir.get("reg"))
+            period = self.data_path.alu.perform(0, self.data_path.register_file.right_out, Opcode.ADD)
+            self.data_path.timer.program(period, self.tick_counter)
+            if self.trace.active:
+                self.trace.event(f"timer: period {period}")
+            self.data_path.signal_latch_pc(self.data_path.pc + 1)
+            self.tick("R" + str(self.data_path.register_file.ir.get("reg")) + " + 0 -> TIMER; PC + 1 -> PC")
         else:
             raise InvalidInputPortNumberError()
 
@@ -580,37 +802,67 @@ class ControlUnit:
         raise UnknownALUCommandError(opcode)
 
     def check_and_handle_interruption(self) -> None:
-        if not self.interruption_enabled:
-            return
-        if not self.data_path.interruption_controller.interruption:
+        interruption_controller = self.data_path.interruption_controller
+        if not self.interruption_enabled or not interruption_controller.interruption:
             return
-        if self.handling_interruption:
+        line = interruption_controller.next_line()
+        if line is None:
             return
 
+        if interruption_controller.in_service:
+            interruption_controller.return_stack.append(self.data_path.register_file.registers[12])
+        interruption_controller.in_service.append(line)
+        interruption_controller.taken += 1
         self.handling_interruption = True
         self.data_path.register_file.latch_reg_n(12, self.data_path.pc)
         self.tick("PC -> R12")
 
         self.data_path.signal_latch_pc(self.data_path.interruption_controller.interruption_address)
-        self.data_path.register_file.latch_reg_n(13, self.data_path.signal_read_memory(self.data_path.pc))
+        self.data_path.register_file.latch_reg_n(
+            13, self.data_path.signal_read_memory(self.data_path.pc, OPERAND_FETCH)
+        )
         self.tick("ADDR_INT_VEC -> PC; MEM[PC] -> AR")
 
         self.data_path.register_file.sel_right_reg(13)
-        self.data_path.signal_latch_pc(
-            self.data_path.alu.perform(0, self.data_path.register_file.right_out.get("int1"), Opcode.ADD)
-        )
+        handler = self.data_path.register_file.right_out.get(f"int{line}")
+        if not isinstance(handler, int):
+            raise MissingInterruptionHandlerError(line)
+        self.data_path.signal_latch_pc(self.data_path.alu.perform(0, handler, Opcode.ADD))
         self.tick("0 + AR -> PC")
 
-        logging.debug("START HANDLING INTERRUPTION")
+        if self.interrupt_stats is not None and line == INPUT_INTERRUPTION_LINE:
+            self.interrupt_stats.handler_entry()
+        if self.trace.active:
+            self.trace.event("START HANDLING INTERRUPTION")
         return
 
 
+def is_instruction(cell, *opcodes: Opcode) -> bool:
+    return isinstance(cell, dict) and cell.get("opcode") in opcodes
+
+
+def is_increment_idiom(load: dict, inc, store) -> bool:
+    """`load r, p; inc r; store r, p` с прямым адресом `p`"""
+    if load.get("opcode") != Opcode.LOAD or load.get("addrType") != DIRECTION_ADDRESS:
+        return False
+    if not is_instruction(inc, Opcode.INC) or not is_instruction(store, Opcode.STORE):
+        return False
+    return inc.get("op") == load.get("reg") and all(
+        store.get(key) == load.get(key) for key in ("reg", "op", "addrType")
+    )
+
+
 def initiate_interruption(control_unit, input_tokens):
+    data_path = control_unit.data_path
+    if data_path.timer.poll(control_unit.tick_counter):
+        data_path.interruption_controller.generate_interruption(len(data_path.memory) - 1, TIMER_INTERRUPTION_LINE)
     if len(input_tokens) != 0:
         next_token = input_tokens[0]
         if control_unit.tick_counter >= next_token[0]:
             address_int = len(control_unit.data_path.memory) - 1
             control_unit.data_path.port_manager.int_signal(control_unit.data_path.interruption_controller, address_int)
+            if control_unit.interrupt_stats is not None:
+                control_unit.interrupt_stats.arrival(*next_token)
             if next_token[1]:
                 control_unit.data_path.port_manager.input_buffer = next_token[1]
                 control_unit.data_path.port_manager.read_buffer()
@@ -620,9 +872,78 @@ def initiate_interruption(control_unit, input_tokens):
     return input_tokens
 
 
-def simulation(code, input_tokens):
-    data_path = DataPath(code)
-    control_unit = ControlUnit(data_path)
+def skip_idle(control_unit: ControlUnit, input_tokens: list, until: int | None = None) -> bool:
+    """Простой по `wait` до ближайшего события ввода или таймера, но не дальше такта `until`.
+
+    `False` -- ожидание не закончилось: события нет до `until` или не будет вовсе.
+    """
+    interruption_controller = control_unit.data_path.interruption_controller
+    if not control_unit.interruption_enabled or interruption_controller.next_line() is None:
+        events = [input_tokens[0][0]] if input_tokens else []
+        if control_unit.data_path.timer.next_tick is not None:
+            events.append(control_unit.data_path.timer.next_tick)
+        wake = min(events, default=None)
+        if wake is None or (until is not None and wake > until):
+            if until is not None:
+                control_unit.idle(until - control_unit.tick_counter)
+            return False
+        control_unit.idle(wake - control_unit.tick_counter)
+    control_unit.waiting = False
+    return True
+
+
+def execute_step(control_unit: ControlUnit, input_tokens: list) -> list:
+    """Шаг цикла моделирования: инструкция, простой по `wait`, ввод и прерывание. Возвращает остаток ввода.
+
+    `StopIteration` -- `halt` или `wait`, после которого событий не будет (`waiting` остаётся установлен).
+    """
+    control_unit.decode_and_execute_instruction()
+    if control_unit.waiting and not skip_idle(control_unit, input_tokens):
+        raise StopIteration()
+    input_tokens = initiate_interruption(control_unit, input_tokens)
+    control_unit.check_and_handle_interruption()
+    return input_tokens
+
+
+def finish_observers(control_unit: ControlUnit) -> None:
+    """Итоги наблюдателей: и при остановке, и при исключении в модели"""
+    if control_unit.interrupt_stats is not None:
+        control_unit.interrupt_stats.finish()
+    if control_unit.metrics is not None:
+        control_unit.metrics.finish()
+
+
+def finish_simulation(control_unit: ControlUnit, instruction_counter: int) -> None:
+    if instruction_counter == INSTRUCTION_LIMIT:
+        logging.warning("Instruction limit reached")
+        control_unit.trace.finish("Instruction limit reached")
+    elif control_unit.waiting:
+        logging.warning("Wait without pending events")
+        control_unit.trace.finish("Wait without pending events")
+    else:
+        control_unit.trace.finish()
+
+
+def simulation(
+    code,
+    input_tokens,
+    trace_sink: TraceSink | None = None,
+    memory_profile: MemoryProfile | None = None,
+    interrupt_stats: InterruptStats | None = None,
+    nested_interruptions: bool = False,
+    fusion: bool = False,
+    data_path: DataPath | None = None,
+    metrics: Metrics | None = None,
+):
+    """`data_path` -- готовый тракт данных с загруженной программой (например, над памятью из пула)"""
+    if data_path is None:
+        data_path = DataPath(code)
+    data_path.interruption_controller.nested = nested_interruptions
+    control_unit = ControlUnit(data_path, trace_sink)
+    control_unit.fusion = fusion
+    for observer in (memory_profile, interrupt_stats, metrics):
+        if observer is not None:
+            observer.attach(control_unit)
 
     control_unit.initialization_cycle()
 
@@ -630,38 +951,116 @@ def simulation(code, input_tokens):
     try:
         while instruction_counter < INSTRUCTION_LIMIT:
             instruction_counter += 1
-            control_unit.decode_and_execute_instruction()
-            input_tokens = initiate_interruption(control_unit, input_tokens)
-            control_unit.check_and_handle_interruption()
+            input_tokens = execute_step(control_unit, input_tokens)
 
     except StopIteration:
         pass
+    except Exception as e:
+        control_unit.trace.finish(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        finish_observers(control_unit)
 
-    if instruction_counter == INSTRUCTION_LIMIT:
-        logging.warning("Instruction limit reached")
-
+    finish_simulation(control_unit, instruction_counter)
     return data_path.port_manager.output_buffer, instruction_counter, control_unit.tick_counter
 
 
-def main(code_file: str, input_file: str):
-    code = read_code(code_file)
+def create_trace_sink(trace_file: str | None, flight_recorder: int) -> TraceSink | None:
+    """Приёмник журнала: файл `trace_file` или бортовой самописец на `flight_recorder` тактов, но не оба"""
+    if flight_recorder and trace_file is not None:
+        raise TraceSinkConflictError()
+    if flight_recorder:
+        recorder = FlightRecorder(flight_recorder)
+        recorder.install_signal_handler()
+        return recorder
+    if trace_file is not None:
+        return open_trace_sink(trace_file)
+    return None
+
+
+def read_input_tokens(input_file: str) -> list:
+    """Расписание ввода: список `(tick, char)`"""
     with open(input_file, encoding="utf-8") as f:
         input_text = f.read().strip()
         if not input_text:
-            input_tokens = []
-        else:
-            input_tokens = eval(input_text)
-
-    output, instruction_counter, ticks = simulation(code, input_tokens)
+            return []
+        return eval(input_text)
+
+
+def main(
+    code_file: str,
+    input_file: str,
+    trace_file: str | None = None,
+    flight_recorder: int = 0,
+    heatmap_file: str | None = None,
+    interrupt_stats: bool = False,
+    nested_interruptions: bool = False,
+    fusion: bool = False,
+    metrics: Metrics | None = None,
+):
+    code = read_code(code_file)
+    input_tokens = read_input_tokens(input_file)
+
+    memory_profile = None if heatmap_file is None else MemoryProfile(MEMORY_SIZE)
+    stats = InterruptStats() if interrupt_stats else None
+    output, instruction_counter, ticks = simulation(
+        code,
+        input_tokens,
+        create_trace_sink(trace_file, flight_recorder),
+        memory_profile,
+        stats,
+        nested_interruptions,
+        fusion,
+        metrics=metrics,
+    )
     print("".join(output) + "\n")
     print(f"instr_counter: {instruction_counter} ticks: {ticks}")
+    if memory_profile is not None:
+        memory_profile.save(heatmap_file)
+        print(summary(memory_profile.rows(), memory_profile.window, memory_profile.working_set, code))
+    if stats is not None:
+        print(interrupt_summary(stats.events))
 
 
 if __name__ == "__main__":
     logging.getLogger().setLevel(logging.DEBUG)
-    assert len(sys.argv) == 3, "Wrong arguments: machine.py <code_file> <input_file>"
-    _, code_file, input_file = sys.argv
-    main(code_file, input_file)
+    parser = argparse.ArgumentParser(description="Модель процессора")
+    parser.add_argument("code_file")
+    parser.add_argument("input_file")
+    trace_sink = parser.add_mutually_exclusive_group()
+    trace_sink.add_argument("--trace", metavar="TRACE_FILE", help="журнал тактов в файл (.trace или сжатый .dtrace)")
+    trace_sink.add_argument(
+        "--flight-recorder", metavar="N", type=int, default=0, help="хранить последние N тактов до аварийной остановки"
+    )
+    parser.add_argument("--heatmap", metavar="HEATMAP_FILE", help="профиль обращений к памяти в файл и сводка")
+    parser.add_argument(
+        "--interrupt-stats", action="store_true", help="задержка входа в обработчик и потерянные символы ввода"
+    )
+    parser.add_argument(
+        "--nested-interrupts", action="store_true", help="разрешить прерывать обработчик более приоритетной линией"
+    )
+    parser.add_argument("--fusion", action="store_true", help="сливать cmp+jz/jnz и load+inc+store в макрооперации")
+    metrics_sink = parser.add_mutually_exclusive_group()
+    metrics_sink.add_argument(
+        "--metrics", metavar="METRICS_FILE", help="выгружать счётчики моделирования в файл JSON-lines"
+    )
+    metrics_sink.add_argument("--metrics-port", type=int, help="отдавать счётчики в формате Prometheus на GET /metrics")
+    parser.add_argument("--metrics-every", metavar="N", type=int, help="выгрузка каждые N инструкций")
+    parser.add_argument(
+        "--metrics-interval", metavar="SECONDS", type=float, default=1.0, help="выгрузка каждые SECONDS секунд"
+    )
+    args = parser.parse_args()
+    main(
+        args.code_file,
+        args.input_file,
+        args.trace,
+        args.flight_recorder,
+        args.heatmap,
+        args.interrupt_stats,
+        args.nested_interrupts,
+        args.fusion,
+        create_metrics(args.metrics, args.metrics_port, args.metrics_every, args.metrics_interval),
+    )
 
 
 class InvalidRegisterNumberError(ValueError):
@@ -674,6 +1073,21 @@ class InvalidInputPortNumberError(ValueError):
         super().__init__("Invalid input port number")
 
 
+class DataPathMemoryError(ValueError):
+    def __init__(self):
+        super().__init__("DataPath needs either code (and optionally memory for it) or shared_memory")
+
+
+class MissingInterruptionHandlerError(ValueError):
+    def __init__(self, line):
+        super().__init__(f"No handler .int{line} for interruption line {line}")
+
+
+class TraceSinkConflictError(ValueError):
+    def __init__(self):
+        super().__init__("Ticks go either to a trace file or to the flight recorder, not both")
+
+
 class MemoryCellError(AssertionError):
     def __init__(self, address):
         super().__init__(f"Memory doesn't have cell with index {address}")
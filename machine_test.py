@@ -0,0 +1,286 @@
+"""Тесты отдельных узлов модели процессора."""
+
+import json
+import pathlib
+import urllib.request
+
+import fusion
+import interrupt_stats
+import lockstep
+import machine
+import memory_profile
+import metrics
+import pytest
+import translator
+from isa import INSTRUCTION_FETCH, MEMORY_SIZE
+
+
+def test_registers_file_numbering():
+    registers = machine.RegistersFile()
+    registers.latch_reg_n(12, 7)
+    registers.latch_reg_n(13, 8)
+    registers.latch_reg_n(15, 9)
+    registers.latch_reg_ir({"opcode": "halt"})
+    assert (registers.r12, registers.ar, registers.ipc) == (7, 8, 9)
+
+    registers.sel_left_reg(12)
+    registers.sel_right_reg(14)
+    assert registers.left_out == 7
+    assert registers.right_out == {"opcode": "halt"}
+
+
+@pytest.mark.parametrize("number", [-1, 14, 16])
+def test_registers_file_rejects_invalid_numbers(number):
+    registers = machine.RegistersFile()
+    with pytest.raises(machine.InvalidRegisterNumberError):
+        registers.latch_reg_n(number, 0)
+    with pytest.raises(machine.InvalidRegisterNumberError):
+        registers.sel_left_reg(number)
+    if number != 14:
+        with pytest.raises(machine.InvalidRegisterNumberError):
+            registers.sel_right_reg(number)
+
+
+def test_memory_profile_counts_access_kinds(tmp_path):
+    code = translator.translate(
+        "section .data:\n    value: 1\n    pointer: value\nsection .text:\n"
+        "    load r0, (pointer)\n    inc r0\n    store r0, value\n    halt"
+    )
+    profile = memory_profile.MemoryProfile(MEMORY_SIZE, window=5)
+    _, instructions, ticks = machine.simulation(code, [], memory_profile=profile)
+
+    value, pointer = 1, 2
+    assert profile.row(value) == (0, 0, 1, 1)
+    assert profile.row(pointer) == (0, 1, 0, 0)
+    assert sum(profile.row(address)[INSTRUCTION_FETCH] for address in profile.touched) == instructions
+    assert 0 < len(profile.working_set) <= ticks // 5 + 1
+
+    heatmap = str(tmp_path / "heatmap")
+    profile.save(heatmap)
+    assert memory_profile.load_heatmap(heatmap) == (profile.rows(), 5, profile.working_set)
+
+
+def test_memory_observers_are_independent():
+    data_path = machine.DataPath(translator.translate("section .text:\n    halt"))
+    first, second = lockstep.WriteRecorder(), lockstep.WriteRecorder()
+    data_path.add_memory_observer(first)
+    data_path.add_memory_observer(second)
+    data_path.signal_write_memory(5, 1)
+    data_path.remove_memory_observer(second)
+    data_path.signal_write_memory(6, 1)
+    assert first.writes == [5, 6]
+    assert second.writes == [5]
+
+
+def test_interrupt_stats_report_latency_and_drops():
+    code = translator.translate(
+        "section .text:\n    ei\n    .loop:\n        jmp .loop\n    .end:\n        halt\n"
+        ".int1:\n    in r1, 0\n    move r2, #48\n    cmp r1, r2\n    jz .end\n    out r1, 1\n    iret"
+    )
+    stats = interrupt_stats.InterruptStats()
+    output, _, _ = machine.simulation(code, [(1, "a"), (2, "b"), (3, "c"), (200, "0")], interrupt_stats=stats)
+
+    assert "".join(output) == "a"
+    assert [event.lost for event in stats.events] == [None, "handler busy", "handler busy", None]
+    first = stats.events[0]
+    assert first.handler_entry - first.arrival == 3
+    assert first.read - first.arrival == 5
+    assert "lost: 2 (interrupts disabled: 0, handler busy: 2" in interrupt_stats.summary(stats.events)
+
+
+def test_input_lost_while_interrupts_disabled():
+    code = translator.translate("section .text:\n    di\n    halt")
+    stats = interrupt_stats.InterruptStats()
+    machine.simulation(code, [(0, "a")], interrupt_stats=stats)
+    assert stats.events[0].lost == "interrupts disabled"
+
+
+TIMER_COUNTER = """
+section .data:
+    count: 0
+section .text:
+    move r0, #50
+    out r0, 2
+    ei
+    .loop:
+        wait
+        load r1, count
+        move r2, #3
+        cmp r1, r2
+        jnz .loop
+    halt
+int 2:
+    load r1, count
+    inc r1
+    store r1, count
+    iret
+"""
+
+
+def test_timer_interrupts_wake_wait():
+    code = translator.translate(TIMER_COUNTER)
+    assert code[-1] == {"int1": "-", "int2": 11}
+    _, instructions, ticks = machine.simulation(code, [])
+    assert ticks > 150
+    assert instructions < 40
+
+
+def test_interruption_priority_and_completion():
+    controller = machine.InterruptionController()
+    controller.generate_interruption(MEMORY_SIZE - 1, machine.TIMER_INTERRUPTION_LINE)
+    controller.generate_interruption(MEMORY_SIZE - 1, machine.INPUT_INTERRUPTION_LINE)
+    assert controller.next_line() == machine.INPUT_INTERRUPTION_LINE
+    controller.in_service.append(controller.next_line())
+    assert controller.next_line() is None
+
+    controller.complete()
+    assert controller.interruption
+    assert controller.next_line() == machine.TIMER_INTERRUPTION_LINE
+
+
+NESTED = """
+section .text:
+    move r0, #20
+    out r0, 2
+    ei
+    wait
+    halt
+.int1:
+    in r1, 0
+    out r1, 1
+    iret
+.int2:
+    move r5, #0
+    out r5, 2
+    move r6, #10
+    move r7, #1
+    .spin:
+        sub r6, r6, r7
+        jnz .spin
+    move r7, #66
+    out r7, 1
+    iret
+"""
+
+
+@pytest.mark.parametrize(("nested", "output"), [(False, "Ba"), (True, "aB")])
+def test_nested_interruption_returns_to_interrupted_handler(nested, output):
+    code = translator.translate(NESTED)
+    buffer, _, _ = machine.simulation(code, [(40, "a")], nested_interruptions=nested)
+    assert "".join(buffer) == output
+    assert lockstep.check(code, [(40, "a")], nested=nested) is None
+
+
+FUSED_LOOP = """
+section .data:
+    counter: 0
+section .text:
+    move r2, #1
+    ei
+    .loop:
+        load r3, counter
+        inc r3
+        store r3, counter
+        cmp r1, r2
+        jnz .loop
+    halt
+.int1:
+    out r12, 1
+    in r1, 0
+    move r1, r2
+    iret
+"""
+
+
+@pytest.mark.parametrize("tick", range(20, 60, 3))
+def test_fusion_keeps_idioms_indivisible_for_interruptions(tick):
+    code = translator.translate(FUSED_LOOP)
+    loop = code.index(next(cell for cell in code if cell.get("opcode") == "load"))
+    buffer, _, _ = machine.simulation(code, [(tick, "a")], fusion=True)
+    assert ord(buffer[0]) in (loop, loop + 3)
+
+
+def test_fused_cells_are_recorded_as_instruction_fetches():
+    code = translator.translate(FUSED_LOOP)
+    profile = memory_profile.MemoryProfile(MEMORY_SIZE)
+    _, instructions, _ = machine.simulation(code, [(60, "a")], None, profile, fusion=True)
+    loop = code.index(next(cell for cell in code if cell.get("opcode") == "load"))
+    fetches = [profile.row(address)[INSTRUCTION_FETCH] for address in range(loop, loop + 5)]
+    assert fetches[:3] == [fetches[0]] * 3
+    assert fetches[3:] == [fetches[3]] * 2
+    assert sum(profile.row(address)[INSTRUCTION_FETCH] for address in profile.touched) > instructions
+
+
+def test_fusion_preserves_golden_output():
+    comparison = fusion.compare_golden(pathlib.Path("golden/hello_world_asm.yml"))
+    assert comparison.fused_ticks < comparison.ticks
+    assert comparison.fused_instructions < comparison.instructions
+
+
+def test_metrics_export_snapshots(tmp_path):
+    code = translator.translate(FUSED_LOOP)
+    path = tmp_path / "metrics.jsonl"
+    profile = memory_profile.MemoryProfile(MEMORY_SIZE)
+    counters = metrics.Metrics(metrics.JsonLinesExporter(str(path)), every_instructions=10, every_seconds=None)
+    buffer, instruction_counter, ticks = machine.simulation(code, [(60, "a")], None, profile, metrics=counters)
+
+    snapshots = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [snapshot["instructions"] for snapshot in snapshots[:-1]] == list(range(11, instruction_counter, 10))
+    final = snapshots[-1]
+    assert final["final"]
+    assert final["instructions"] == instruction_counter
+    assert sum(final["opcodes"].values()) == final["instructions"] - 1
+    assert final["ticks"] == ticks
+    assert final["interrupts"] == 1
+    assert final["output_bytes"] == len(buffer)
+    assert final["memory_writes"] == final["opcodes"]["store"]
+    assert profile.rows(), "memory profile still receives accesses"
+
+
+def test_metrics_finish_when_simulation_fails(tmp_path):
+    code = translator.translate("section .text:\n    in r0, 5\n    halt")
+    path = tmp_path / "metrics.jsonl"
+    counters = metrics.Metrics(metrics.JsonLinesExporter(str(path)), every_seconds=None)
+    with pytest.raises(machine.InvalidInputPortNumberError):
+        machine.simulation(code, [], metrics=counters)
+    assert counters.exporter.file.closed
+    final = json.loads(path.read_text().splitlines()[-1])
+    assert final["final"]
+    assert final["opcodes"] == {"in": 1}
+
+
+def test_metrics_prometheus_endpoint():
+    exporter = metrics.PrometheusExporter(0)
+    try:
+        exporter.export({"instructions": 7, "ticks": 20, "instructions_per_second": 0.0, "opcodes": {"inc": 7}})
+        text = urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics").read().decode()
+    finally:
+        exporter.close()
+    assert "risk_instructions_total 7\n" in text
+    assert 'risk_opcode_instructions_total{opcode="inc"} 7\n' in text
+
+
+def test_timer_without_handler_is_reported():
+    code = translator.translate("section .text:\n    move r0, #5\n    out r0, 2\n    ei\n    wait\n    halt")
+    with pytest.raises(machine.MissingInterruptionHandlerError):
+        machine.simulation(code, [])
+    assert lockstep.check(code, []) is None
+
+
+def test_metrics_count_fused_component_opcodes(tmp_path):
+    code = translator.translate(FUSED_LOOP)
+    path = tmp_path / "metrics.jsonl"
+    counters = metrics.Metrics(metrics.JsonLinesExporter(str(path)), every_seconds=None)
+    _, instruction_counter, _ = machine.simulation(code, [(60, "a")], fusion=True, metrics=counters)
+    final = json.loads(path.read_text().splitlines()[-1])
+    opcodes = final["opcodes"]
+    assert final["instructions"] == instruction_counter
+    assert sum(opcodes.values()) == final["instructions"] - 1 + final["fused"]
+    assert opcodes["load"] == opcodes["inc"] == opcodes["store"]
+    assert opcodes["cmp"] == opcodes["jnz"]
+    assert final["fused"] > 0
+
+
+def test_metrics_need_a_single_sink(tmp_path):
+    with pytest.raises(metrics.MetricsSinkConflictError):
+        metrics.create_metrics(str(tmp_path / "metrics.jsonl"), 0, None, 1.0)
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+"""Профиль обращений к памяти: тепловая карта и рабочее множество.
+
+Счётчики хранятся в типизированных массивах на всю память модели, по
+четыре на ячейку: выборка инструкции, выборка операнда (косвенный адрес,
+вектор прерывания), чтение и запись данных. Рабочее множество -- число
+различных ячеек, к которым обращались за окно из `window` тактов.
+
+Тепловую карту можно посмотреть позже: `memory_profile.py <heatmap_file> [<code_file>]`.
+"""
+
+import array
+import bisect
+import struct
+import sys
+
+from isa import DATA_READ, DATA_WRITE, INSTRUCTION_FETCH, MEMORY_SIZE, OPERAND_FETCH, collect_labels, read_code
+
+ACCESS_KINDS = 4
+ACCESS_NAMES = {INSTRUCTION_FETCH: "fetch", OPERAND_FETCH: "operand", DATA_READ: "read", DATA_WRITE: "write"}
+WINDOW_TICKS = 100
+HEATMAP_MAGIC = b"RMHEAT\x01"
+HEATMAP_HEADER = struct.Struct("<II")
+HEATMAP_ROW = struct.Struct("<I4I")
+
+
+class MemoryProfile:
+    counts: array.array = None
+    last_window: array.array = None
+    touched: list = None
+    working_set: list = None
+    window: int = None
+    control_unit = None
+
+    def __init__(self, memory_size: int, window: int = WINDOW_TICKS):
+        self.counts = array.array("I", bytes(4 * ACCESS_KINDS * memory_size))
+        self.last_window = array.array("i", b"\xff" * 4 * memory_size)
+        self.touched = []
+        self.working_set = []
+        self.window = window
+
+    def attach(self, control_unit) -> None:
+        """Подключить профиль к тракту данных; время берётся из счётчика тактов"""
+        self.control_unit = control_unit
+        control_unit.data_path.add_memory_observer(self)
+
+    def record(self, address: int, access: int) -> None:
+        self.counts[address * ACCESS_KINDS + access] += 1
+        window = self.control_unit.tick_counter // self.window
+        last = self.last_window[address]
+        if last != window:
+            if last < 0:
+                self.touched.append(address)
+            self.last_window[address] = window
+            while len(self.working_set) <= window:
+                self.working_set.append(0)
+            self.working_set[window] += 1
+
+    def row(self, address: int) -> tuple:
+        start = address * ACCESS_KINDS
+        return tuple(self.counts[start : start + ACCESS_KINDS])
+
+    def rows(self) -> dict:
+        """Счётчики по адресам, к которым было хотя бы одно обращение"""
+        return {address: self.row(address) for address in sorted(self.touched)}
+
+    def save(self, filename: str) -> None:
+        """Записать рабочее множество по окнам и строку счётчиков на каждую использованную ячейку"""
+        with open(filename, "wb") as file:
+            file.write(HEATMAP_MAGIC + HEATMAP_HEADER.pack(self.window, len(self.working_set)))
+            file.write(array.array("I", self.working_set).tobytes())
+            for address, counts in self.rows().items():
+                file.write(HEATMAP_ROW.pack(address, *counts))
+
+
+def load_heatmap(filename: str) -> tuple:
+    """Счётчики по адресам, размер окна и рабочее множество по окнам"""
+    with open(filename, "rb") as file:
+        data = file.read()
+    assert data.startswith(HEATMAP_MAGIC), f"{filename} is not a heatmap"
+    window, windows = HEATMAP_HEADER.unpack_from(data, len(HEATMAP_MAGIC))
+    offset = len(HEATMAP_MAGIC) + HEATMAP_HEADER.size
+    working_set = array.array("I", data[offset : offset + 4 * windows]).tolist()
+    rows = {}
+    for address, *counts in HEATMAP_ROW.iter_unpack(data[offset + 4 * windows :]):
+        rows[address] = tuple(counts)
+    return rows, window, working_set
+
+
+def describe_cell(code: list, labels: dict, address: int) -> str:
+    """Имя ячейки: метка, смещение от метки данных или инструкция"""
+    if address in labels:
+        return labels[address]
+    if address >= len(code) - 1:
+        return "int vector" if address == MEMORY_SIZE - 1 else f"@{address}"
+    if "opcode" in code[address]:
+        return f"{code[address]['opcode']} @{address}"
+    known = sorted(labels)
+    position = bisect.bisect_left(known, address) - 1
+    if position >= 0 and all("opcode" not in cell for cell in code[known[position] : address + 1]):
+        return f"{labels[known[position]]}+{address - known[position]}"
+    return f"data @{address}"
+
+
+def summary(rows: dict, window: int, working_set: list, code: list | None = None, top: int = 10) -> str:
+    totals = [sum(counts[kind] for counts in rows.values()) for kind in range(ACCESS_KINDS)]
+    lines = [
+        "memory accesses: " + " ".join(f"{ACCESS_NAMES[kind]}: {totals[kind]}" for kind in range(ACCESS_KINDS)),
+        f"cells touched: {len(rows)}",
+    ]
+    if working_set:
+        mean = sum(working_set) / len(working_set)
+        lines.append(
+            f"working set per {window} ticks: min: {min(working_set)} mean: {mean:.1f} max: {max(working_set)}"
+        )
+    labels = collect_labels(code) if code is not None else {}
+    lines.append("hottest cells:")
+    for address, counts in sorted(rows.items(), key=lambda item: -sum(item[1]))[:top]:
+        name = describe_cell(code, labels, address) if code is not None else str(address)
+        details = " ".join(f"{ACCESS_NAMES[kind]}: {counts[kind]}" for kind in range(ACCESS_KINDS) if counts[kind])
+        lines.append(f"  {address:>7} {name:<16} {details}")
+    return "\n".join(lines)
+
+
+def main(heatmap_file: str, code_file: str | None = None):
+    code = read_code(code_file) if code_file is not None else None
+    print(summary(*load_heatmap(heatmap_file), code))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (2, 3), "Wrong arguments: memory_profile.py <heatmap_file> [<code_file>]"
+    main(*sys.argv[1:])
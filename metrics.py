@@ -0,0 +1,220 @@
+"""Счётчики моделирования и их периодическая выгрузка во время долгого запуска.
+
+`Metrics` подключается к устройству управления как наблюдатель и считает
+выполненные инструкции по кодам операций и записи в память. Число инструкций
+считается как `instr_counter` модели: цикл инициализации -- первая инструкция,
+макрооперация при слиянии (`fusion`) -- одна инструкция. В `opcodes` же
+учтена каждая инструкция макрооперации (`cmp` и `jz`, `load`, `inc` и
+`store`), так что со слиянием сумма `opcodes` больше `instructions - 1`
+на `fused` -- число инструкций, исполненных внутри макроопераций. Такты, число
+принятых прерываний и выведенные байты в счётчиках не дублируются: они
+читаются из модели в момент выгрузки.
+
+Снимок выгружается каждые `every_instructions` инструкций и/или каждые
+`every_seconds` секунд. Время проверяется не чаще раза в `POLL_INSTRUCTIONS`
+инструкций, так что на инструкцию приходятся вызов метода и сравнение. В
+снимке есть мгновенная скорость -- инструкций в секунду с прошлой выгрузки.
+Последний снимок (`"final": true`) выгружается при остановке моделирования,
+в том числе из-за исключения.
+
+Выгрузка:
+
+- `JsonLinesExporter` -- снимок строкой JSON в файл;
+- `PrometheusExporter` -- последний снимок в текстовом формате Prometheus
+  по `GET /metrics` на локальном порту.
+"""
+
+import collections
+import http.server
+import json
+import threading
+import time
+
+from isa import DATA_WRITE
+
+POLL_INSTRUCTIONS = 4096
+PROMETHEUS_PREFIX = "risk"
+
+
+class JsonLinesExporter:
+    file = None
+
+    def __init__(self, path: str):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def export(self, snapshot: dict) -> None:
+        self.file.write(json.dumps(snapshot) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class PrometheusExporter:
+    server: http.server.ThreadingHTTPServer = None
+    text: str = None
+
+    def __init__(self, port: int, host: str = "127.0.0.1"):
+        self.text = ""
+        exporter = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def export(self, snapshot: dict) -> None:
+        self.text = prometheus_text(snapshot)
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def prometheus_text(snapshot: dict) -> str:
+    """Снимок в текстовом формате Prometheus
+
+    >>> print(prometheus_text({"instructions": 3, "instructions_per_second": 1.5, "opcodes": {"halt": 1}}))
+    # TYPE risk_instructions_total counter
+    risk_instructions_total 3
+    # TYPE risk_instructions_per_second gauge
+    risk_instructions_per_second 1.5
+    # TYPE risk_opcode_instructions_total counter
+    risk_opcode_instructions_total{opcode="halt"} 1
+    <BLANKLINE>
+    """
+    lines = []
+    for name, value in snapshot.items():
+        if isinstance(value, bool) or name in ("time", "opcodes"):
+            continue
+        kind, metric = ("gauge", name) if name == "instructions_per_second" else ("counter", f"{name}_total")
+        lines += [f"# TYPE {PROMETHEUS_PREFIX}_{metric} {kind}", f"{PROMETHEUS_PREFIX}_{metric} {value}"]
+    lines.append(f"# TYPE {PROMETHEUS_PREFIX}_opcode_instructions_total counter")
+    lines += [
+        f'{PROMETHEUS_PREFIX}_opcode_instructions_total{{opcode="{opcode}"}} {count}'
+        for opcode, count in snapshot["opcodes"].items()
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class Metrics:
+    exporter = None
+    every_instructions: int = None
+    every_seconds: float = None
+    control_unit = None
+    instructions: int = None
+    opcodes: collections.Counter = None
+    fused_instructions: int = None
+    memory_writes: int = None
+    next_poll: int = None
+    started: float = None
+    last_time: float = None
+    last_instructions: int = None
+
+    def __init__(self, exporter, every_instructions: int | None = None, every_seconds: float | None = 1.0):
+        self.exporter = exporter
+        self.every_instructions = every_instructions
+        self.every_seconds = every_seconds
+        self.instructions = 1
+        self.opcodes = collections.Counter()
+        self.fused_instructions = 0
+        self.memory_writes = 0
+        self.last_instructions = 1
+        self.next_poll = self.instructions + self.poll_step()
+
+    def attach(self, control_unit) -> None:
+        self.control_unit = control_unit
+        control_unit.metrics = self
+        control_unit.data_path.add_memory_observer(self)
+        self.started = self.last_time = time.monotonic()
+
+    def poll_step(self) -> int:
+        if self.every_instructions is None:
+            return POLL_INSTRUCTIONS
+        return min(self.every_instructions, POLL_INSTRUCTIONS)
+
+    def instruction(self, opcode) -> None:
+        self.instructions += 1
+        self.opcodes[opcode] += 1
+        if self.instructions >= self.next_poll:
+            self.poll()
+
+    def fused(self, *opcodes) -> None:
+        """Инструкции, исполненные макрооперацией вслед за первой"""
+        self.fused_instructions += len(opcodes)
+        self.opcodes.update(opcodes)
+
+    def record(self, address: int, access: int) -> None:
+        if access == DATA_WRITE:
+            self.memory_writes += 1
+
+    def poll(self) -> None:
+        self.next_poll = self.instructions + self.poll_step()
+        now = time.monotonic()
+        by_count = (
+            self.every_instructions is not None
+            and self.instructions - self.last_instructions >= self.every_instructions
+        )
+        by_time = self.every_seconds is not None and now - self.last_time >= self.every_seconds
+        if by_count or by_time:
+            self.export(now)
+
+    def snapshot(self, now: float, final: bool = False) -> dict:
+        control_unit = self.control_unit
+        elapsed = now - self.last_time
+        rate = (self.instructions - self.last_instructions) / elapsed if elapsed > 0 else 0.0
+        return {
+            "time": round(now - self.started, 6),
+            "instructions": self.instructions,
+            "ticks": control_unit.tick_counter,
+            "instructions_per_second": round(rate, 1),
+            "interrupts": control_unit.data_path.interruption_controller.taken,
+            "output_bytes": len(control_unit.data_path.port_manager.output_buffer),
+            "memory_writes": self.memory_writes,
+            "fused": self.fused_instructions,
+            "opcodes": {str(opcode): count for opcode, count in sorted(self.opcodes.items())},
+            "final": final,
+        }
+
+    def export(self, now: float, final: bool = False) -> None:
+        self.exporter.export(self.snapshot(now, final))
+        self.last_time, self.last_instructions = now, self.instructions
+
+    def finish(self) -> None:
+        self.export(time.monotonic(), final=True)
+        self.exporter.close()
+
+
+def create_metrics(
+    path: str | None, port: int | None, every_instructions: int | None, every_seconds: float | None
+) -> Metrics | None:
+    """Счётчики с выгрузкой в файл JSON-lines (`path`) или на порт Prometheus (`port`); без обоих -- `None`"""
+    if path is not None and port is not None:
+        raise MetricsSinkConflictError()
+    if path is not None:
+        return Metrics(JsonLinesExporter(path), every_instructions, every_seconds)
+    if port is not None:
+        return Metrics(PrometheusExporter(port), every_instructions, every_seconds)
+    return None
+
+
+class MetricsSinkConflictError(ValueError):
+    def __init__(self):
+        super().__init__("Metrics go either to a JSON-lines file or to a Prometheus port, not both")
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""Многоядерная модель: несколько ядер (hart) над общей памятью.
+
+У каждого ядра свои `ControlUnit` и `DataPath` -- регистры, PC, АЛУ,
+контроллер прерываний и таймер, -- а память одна на всех. Порты ввода-вывода
+тоже общие: вывод ядер попадает в один буфер, а прерывания ввода по
+расписанию получает только ядро 0. Номер ядра читается из порта 3
+(`in r0, 3`), поэтому ядра могут выполнять один код и делить работу по
+номеру.
+
+Ядро 0 начинает с `.text`, ядро `N` -- с метки `.hartN:`, если она есть
+(адрес в векторе `hartN`), иначе тоже с `.text`.
+
+Чередование ядер детерминировано:
+
+- `instruction` -- по кругу, по одной инструкции каждого ядра;
+- `tick` -- следующую инструкцию выполняет ядро с наименьшим счётчиком
+  тактов, как если бы ядра работали параллельно от общего генератора.
+
+Инструкция выполняется целиком, поэтому `cas` атомарна, а
+последовательность `load`/`inc`/`store` -- нет. Журнал тактов не ведётся.
+
+Интерфейс командной строки:
+`multicore.py <machine_code_file> <input_file> [--harts N] [--schedule instruction|tick] [--nested-interrupts]`.
+"""
+
+import argparse
+
+from isa import read_code
+from machine import INSTRUCTION_LIMIT, ControlUnit, DataPath, execute_step, read_input_tokens
+from tracer import NullTraceSink
+
+SCHEDULES = ("instruction", "tick")
+
+
+class Hart:
+    number: int = None
+    data_path: DataPath = None
+    control_unit: ControlUnit = None
+    input_tokens: list = None
+    instruction_counter: int = None
+    halted: str = None
+
+    def __init__(self, number: int, data_path: DataPath, input_tokens: list):
+        self.number = number
+        self.data_path = data_path
+        self.control_unit = ControlUnit(data_path, NullTraceSink())
+        self.input_tokens = input_tokens
+        self.instruction_counter = 0
+
+    def start(self, entry: int | None = None) -> None:
+        """Цикл инициализации; `entry` -- своя точка входа ядра вместо `.text`"""
+        self.control_unit.initialization_cycle()
+        if entry is not None:
+            self.data_path.signal_latch_pc(entry)
+        self.instruction_counter = 1
+
+    def step(self) -> None:
+        self.instruction_counter += 1
+        try:
+            self.input_tokens = execute_step(self.control_unit, self.input_tokens)
+        except StopIteration:
+            self.halted = "wait without pending events" if self.control_unit.waiting else "halt"
+            return
+        if self.instruction_counter >= INSTRUCTION_LIMIT:
+            self.halted = "instruction limit reached"
+
+
+def create_harts(code: list, input_tokens: list, count: int, nested_interruptions: bool = False) -> list:
+    """Ядра над общей памятью и общими портами; ввод по расписанию -- ядру 0"""
+    first = DataPath(code)
+    harts = []
+    for number in range(count):
+        data_path = first if number == 0 else DataPath(shared_memory=first.memory, hart_id=number)
+        data_path.port_manager = first.port_manager
+        data_path.interruption_controller.nested = nested_interruptions
+        harts.append(Hart(number, data_path, list(input_tokens) if number == 0 else []))
+    vector = first.memory[-1]
+    for hart in harts:
+        entry = vector.get(f"hart{hart.number}")
+        hart.start(entry if isinstance(entry, int) else None)
+    return harts
+
+
+def run_instruction_schedule(harts: list) -> None:
+    while running := [hart for hart in harts if hart.halted is None]:
+        for hart in running:
+            hart.step()
+
+
+def run_tick_schedule(harts: list) -> None:
+    while running := [hart for hart in harts if hart.halted is None]:
+        min(running, key=lambda hart: (hart.control_unit.tick_counter, hart.number)).step()
+
+
+SCHEDULERS = {"instruction": run_instruction_schedule, "tick": run_tick_schedule}
+
+
+def simulation(
+    code: list, input_tokens: list, harts: int = 2, schedule: str = "instruction", nested_interruptions: bool = False
+) -> tuple:
+    """Моделировать до остановки всех ядер: (вывод, список ядер)"""
+    assert schedule in SCHEDULERS, f"Unknown schedule {schedule}"
+    cores = create_harts(code, input_tokens, harts, nested_interruptions)
+    SCHEDULERS[schedule](cores)
+    return cores[0].data_path.port_manager.output_buffer, cores
+
+
+def summary(harts: list) -> str:
+    """Статистика по ядрам и время работы всей машины (максимум тактов по ядрам)"""
+    lines = [
+        f"hart {hart.number}: instr_counter: {hart.instruction_counter} "
+        f"ticks: {hart.control_unit.tick_counter} ({hart.halted})"
+        for hart in harts
+    ]
+    instructions = sum(hart.instruction_counter for hart in harts)
+    makespan = max(hart.control_unit.tick_counter for hart in harts)
+    lines.append(f"total: instr_counter: {instructions} makespan: {makespan} ticks")
+    return "\n".join(lines)
+
+
+def main(code_file: str, input_file: str, harts: int, schedule: str, nested_interruptions: bool):
+    output, cores = simulation(
+        read_code(code_file), read_input_tokens(input_file), harts, schedule, nested_interruptions
+    )
+    print("".join(output) + "\n")
+    print(summary(cores))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Многоядерная модель процессора, общая память")
+    parser.add_argument("code_file")
+    parser.add_argument("input_file")
+    parser.add_argument("--harts", type=int, default=2, help="число ядер")
+    parser.add_argument("--schedule", choices=SCHEDULES, default="instruction", help="чередование ядер")
+    parser.add_argument("--nested-interrupts", action="store_true", help="вложенные прерывания в каждом ядре")
+    args = parser.parse_args()
+    main(args.code_file, args.input_file, args.harts, args.schedule, args.nested_interrupts)
@@ -0,0 +1,73 @@
+"""Тесты многоядерной модели."""
+
+import machine
+import multicore
+import pytest
+import translator
+
+COUNTER = """
+section .data:
+    lock: 0
+    counter: 0
+section .text:
+    move r5, #0
+    move r6, #10
+    move r7, #1
+    move r8, #0
+    .acquire:
+        move r0, #0
+        cas r0, r7, lock
+        jnz .acquire
+    load r1, counter
+    inc r1
+    store r1, counter
+    store r8, lock
+    inc r5
+    cmp r5, r6
+    jnz .acquire
+    halt
+"""
+COUNTER_CELL = 2
+
+
+@pytest.mark.parametrize("schedule", multicore.SCHEDULES)
+@pytest.mark.parametrize("harts", [1, 2, 3])
+def test_cas_lock_keeps_counter_consistent(schedule, harts):
+    code = translator.translate(COUNTER)
+    _, cores = multicore.simulation(code, [], harts, schedule)
+    assert cores[0].data_path.memory[COUNTER_CELL] == {"data": 10 * harts}
+    assert all(core.halted == "halt" for core in cores)
+
+
+def test_updates_without_lock_are_lost():
+    unlocked = COUNTER.replace("        move r0, #0\n        cas r0, r7, lock\n        jnz .acquire\n", "")
+    _, cores = multicore.simulation(translator.translate(unlocked), [], 2, "tick")
+    assert cores[0].data_path.memory[COUNTER_CELL] == {"data": 10}
+
+
+def test_single_hart_matches_simulation():
+    code = translator.translate(COUNTER)
+    _, instructions, ticks = machine.simulation(code, [])
+    _, (core,) = multicore.simulation(code, [], 1)
+    assert (core.instruction_counter, core.control_unit.tick_counter) == (instructions, ticks)
+
+
+def test_hart_entries_and_id_port():
+    code = translator.translate(
+        "section .text:\n    in r0, 3\n    move r1, #48\n    add r0, r0, r1\n    out r0, 1\n    halt\n"
+        ".hart2:\n    move r0, #66\n    out r0, 1\n    halt"
+    )
+    assert code[-1] == {"int1": "-", "hart2": 6}
+    output, cores = multicore.simulation(code, [], 3)
+    assert sorted(output) == ["0", "1", "B"]
+    assert "total: instr_counter: 16 makespan: 16 ticks" in multicore.summary(cores)
+
+
+def test_data_path_needs_either_code_or_shared_memory():
+    code = translator.translate(COUNTER)
+    with pytest.raises(machine.DataPathMemoryError):
+        machine.DataPath(code, shared_memory=machine.DataPath(code).memory)
+    with pytest.raises(machine.DataPathMemoryError):
+        machine.DataPath()
+    with pytest.raises(machine.DataPathMemoryError):
+        machine.DataPath(memory=[0] * 10, shared_memory=machine.DataPath(code).memory)
@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+"""Долгоживущий сервис трансляции и моделирования по протоколу JSON-lines.
+
+Один процесс обслуживает много запусков: модули импортированы один раз,
+оттранслированные программы кэшируются по хэшу исходного текста, а память
+модели (`MEMORY_SIZE` ячеек) не создаётся заново на каждый запуск -- перед
+загрузкой программы обнуляются только ячейки, занятые прошлой программой или
+записанные ею.
+
+Запрос -- объект JSON в одной строке, ответ -- тоже в одной строке, с тем же
+`id`:
+
+- `{"op": "assemble", "source": "..."}` -- `{"ok": true, "program": <хэш>, "size": <ячеек>, "cached": bool}`;
+- `{"op": "run", "source" | "program": ..., "input": [[tick, char], ...], "nested_interrupts": false}` --
+  `{"ok": true, "output": "...", "instr_counter": N, "ticks": N, "cached": bool}`;
+- `{"op": "batch", "jobs": [<запросы run>]}` -- `{"ok": true, "results": [<ответы>]}`;
+- `{"op": "stats"}` -- число запусков и попаданий в кэш.
+
+Ошибка запроса или моделирования -- `{"ok": false, "error": "<тип>: <сообщение>"}`.
+
+Интерфейс командной строки: `service.py [--socket <path>]`; без `--socket` -- stdin/stdout.
+"""
+
+import argparse
+import collections
+import hashlib
+import json
+import socketserver
+import sys
+import threading
+
+from isa import DATA_WRITE, MEMORY_SIZE
+from machine import DataPath, simulation
+from tracer import NullTraceSink
+from translator import translate
+
+CACHE_SIZE = 256
+
+
+class ProgramCache:
+    """Оттранслированные программы по хэшу исходного текста, вытесняются давно не использованные"""
+
+    programs: collections.OrderedDict = None
+    capacity: int = None
+    hits: int = None
+    misses: int = None
+
+    def __init__(self, capacity: int = CACHE_SIZE):
+        self.programs = collections.OrderedDict()
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source: str) -> str:
+        return hashlib.sha256(source.encode()).hexdigest()
+
+    def assemble(self, source: str) -> tuple:
+        """(хэш, машинный код, был ли в кэше)"""
+        key = self.key(source)
+        cached = key in self.programs
+        if cached:
+            self.hits += 1
+            self.programs.move_to_end(key)
+        else:
+            self.misses += 1
+            self.programs[key] = translate(source)
+            if len(self.programs) > self.capacity:
+                self.programs.popitem(last=False)
+        return key, self.programs[key], cached
+
+    def get(self, key: str) -> list:
+        if key not in self.programs:
+            raise UnknownProgramError(key)
+        self.hits += 1
+        self.programs.move_to_end(key)
+        return self.programs[key]
+
+
+class WarmMemory:
+    """Память модели для повторных запусков: наблюдатель записей тракта данных помечает изменённые ячейки"""
+
+    cells: list = None
+    dirty: set = None
+
+    def __init__(self):
+        self.cells = [0] * MEMORY_SIZE
+        self.dirty = set()
+
+    def prepare(self, code: list) -> list:
+        """Обнулить ячейки прошлого запуска; программу в возвращённую память загружает `DataPath`"""
+        cells = self.cells
+        for address in self.dirty:
+            cells[address] = 0
+        self.dirty = set(range(len(code) - 1))
+        return cells
+
+    def attach(self, control_unit) -> None:
+        control_unit.data_path.add_memory_observer(self)
+
+    def record(self, address: int, access: int) -> None:
+        if access == DATA_WRITE:
+            self.dirty.add(address)
+
+
+class SimulatorService:
+    cache: ProgramCache = None
+    memory: WarmMemory = None
+    runs: int = None
+    lock: threading.Lock = None
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache = ProgramCache(cache_size)
+        self.memory = WarmMemory()
+        self.runs = 0
+        self.lock = threading.Lock()
+
+    def handle(self, request: dict) -> dict:
+        """Ответ на запрос; запросы из разных соединений выполняются по одному"""
+        with self.lock:
+            return self.respond(request, self.dispatch)
+
+    @staticmethod
+    def respond(request: dict, action) -> dict:
+        """Результат `action(request)` или ошибка, с `id` запроса"""
+        try:
+            response = {"ok": True, **action(request)}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def dispatch(self, request: dict) -> dict:
+        op = request.get("op")
+        if op == "assemble":
+            key, code, cached = self.cache.assemble(request["source"])
+            return {"program": key, "size": len(code), "cached": cached}
+        if op == "run":
+            return self.run(request)
+        if op == "batch":
+            # Ошибка одного задания не прерывает остальные
+            return {"results": [self.respond(job, self.run) for job in request["jobs"]]}
+        if op == "stats":
+            return {"runs": self.runs, "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+        raise UnknownOperationError(op)
+
+    def run(self, request: dict) -> dict:
+        if "program" in request:
+            code, cached = self.cache.get(request["program"]), True
+        else:
+            _, code, cached = self.cache.assemble(request["source"])
+        input_tokens = [(tick, char) for tick, char in request.get("input", [])]
+
+        data_path = DataPath(code, memory=self.memory.prepare(code))
+        self.runs += 1
+        output, instruction_counter, ticks = simulation(
+            code,
+            input_tokens,
+            NullTraceSink(),
+            self.memory,
+            nested_interruptions=request.get("nested_interrupts", False),
+            data_path=data_path,
+        )
+        return {"output": "".join(output), "instr_counter": instruction_counter, "ticks": ticks, "cached": cached}
+
+    def serve_lines(self, lines, write) -> None:
+        """Обработать поток строк-запросов, ответы передаются `write` по одной строке"""
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                response = {"ok": False, "error": f"JSONDecodeError: {e}"}
+            else:
+                response = self.handle(request)
+            write(json.dumps(response, ensure_ascii=False) + "\n")
+
+
+class ConnectionHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        lines = (line.decode() for line in self.rfile)
+
+        def write(text: str) -> None:
+            self.wfile.write(text.encode())
+            self.wfile.flush()
+
+        self.server.service.serve_lines(lines, write)
+
+
+def serve_socket(service: SimulatorService, path: str) -> None:
+    with socketserver.ThreadingUnixStreamServer(path, ConnectionHandler) as server:
+        server.service = service
+        server.serve_forever()
+
+
+def main(socket_path: str | None):
+    service = SimulatorService()
+    if socket_path is not None:
+        serve_socket(service, socket_path)
+        return
+
+    def write(text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    service.serve_lines(sys.stdin, write)
+
+
+class UnknownProgramError(ValueError):
+    def __init__(self, key):
+        super().__init__(f"Unknown program {key}, assemble it first")
+
+
+class UnknownOperationError(ValueError):
+    def __init__(self, op):
+        super().__init__(f"Unknown operation {op!r}, expected assemble, run, batch or stats")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервис трансляции и моделирования, протокол JSON-lines")
+    parser.add_argument("--socket", help="путь к Unix-сокету; без него -- stdin/stdout")
+    args = parser.parse_args()
+    main(args.socket)
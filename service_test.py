@@ -0,0 +1,55 @@
+"""Тесты сервиса моделирования."""
+
+import json
+from pathlib import Path
+
+import machine
+import service
+import translator
+
+WRITER = """
+section .data:
+    pointer: 5000
+section .text:
+    move r0, #65
+    store r0, (pointer)
+    halt
+"""
+
+
+def test_run_matches_simulation_and_caches_program():
+    source = Path("examples/hello_world.asm").read_text(encoding="utf-8")
+    simulator = service.SimulatorService()
+    assembled = simulator.handle({"id": 1, "op": "assemble", "source": source})
+    assert (assembled["ok"], assembled["id"], assembled["cached"]) == (True, 1, False)
+
+    response = simulator.handle({"op": "run", "program": assembled["program"]})
+    output, instructions, ticks = machine.simulation(translator.translate(source), [])
+    assert (response["output"], response["instr_counter"], response["ticks"]) == ("".join(output), instructions, ticks)
+    assert simulator.handle({"op": "stats"})["cache_misses"] == 1
+
+
+def test_warm_memory_is_reset_between_runs():
+    simulator = service.SimulatorService()
+    assert simulator.handle({"op": "run", "source": WRITER})["ok"]
+    assert simulator.memory.cells[5000] == {"data": 65}
+    assert simulator.memory.cells[1]["data"] == 5000, "program is loaded into the pooled memory"
+
+    halt, missing = simulator.handle(
+        {"op": "batch", "jobs": [{"source": "section .text:\n    halt"}, {"id": 2, "program": "missing"}]}
+    )["results"]
+    assert halt["ok"]
+    assert simulator.memory.cells[5000] == 0
+    assert missing["id"] == 2
+    assert missing["error"].startswith("UnknownProgramError")
+
+
+def test_json_lines_errors_keep_serving():
+    simulator = service.SimulatorService()
+    lines = ["not json\n", json.dumps({"id": "x", "op": "fly"}) + "\n", json.dumps({"op": "stats"}) + "\n"]
+    responses = []
+    simulator.serve_lines(lines, responses.append)
+    decoded = [json.loads(line) for line in responses]
+    assert [response["ok"] for response in decoded] == [False, False, True]
+    assert decoded[1]["id"] == "x"
+    assert decoded[1]["error"].startswith("UnknownOperationError")
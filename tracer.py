@@ -0,0 +1,494 @@
+#!/usr/bin/python3
+"""Журнал состояния процессора по тактам с подключаемыми приёмниками.
+
+`ControlUnit.tick` передаёт приёмнику снимок состояния -- кортеж полей
+`TRACE_FIELDS`. Приёмник решает, что с ним делать:
+
+- `NullTraceSink` -- ничего (снимок даже не строится);
+- `TextTraceSink` -- текстовый журнал через `logging`, как раньше;
+- `RingBufferTraceSink` -- последние N снимков в памяти;
+- `FlightRecorder` -- то же, с выводом текстом при аварийной остановке;
+- `BinaryTraceSink` -- запись фиксированного формата в файл;
+- `DeltaTraceSink` -- в файл только изменившиеся поля, с опорными кадрами.
+
+Текстовый журнал можно получить из файла позже:
+`tracer.py <trace_file> [<start_tick>]`.
+"""
+
+import bisect
+import collections
+import logging
+import signal
+import struct
+import sys
+from pathlib import Path
+
+TRACE_FIELDS = (
+    "tick",
+    "pc",
+    "zero_flag",
+    *(f"r{number}" for number in range(13)),
+    "ar",
+    "ipc",
+    "ir",
+    "instruction",
+    "term",
+    "port_0",
+    "port_1",
+    "interruption",
+    "interruption_address",
+    "interruption_enabled",
+    "handling_interruption",
+    "micro_op",
+)
+REGISTER_FIELDS = slice(3, 18)
+
+TRACE_MAGIC = b"RMTRACE\x01"
+TICK_RECORD = 1
+STRING_RECORD = 2
+EVENT_RECORD = 3
+
+# Запись такта: вид, такт, PC, флаг, r0..r12, ar, ipc, ir, инструкция, term,
+# порты, флаги прерываний, адрес вектора, микрооперация, маска строковых полей.
+TICK_STRUCT = struct.Struct("<BIiB15iHHiiiBiHI")
+STRING_HEADER = struct.Struct("<BHH")
+EVENT_HEADER = struct.Struct("<BI")
+
+# Числовые поля записи (индексы в снимке), которые могут хранить не int
+BOXABLE_FIELDS = (1, *range(3, 18), 20, 21, 22, 24)
+
+
+def format_tick(state: tuple) -> str:
+    """Текстовое представление такта в формате журнала `ControlUnit.tick`"""
+    tick, pc, zero_flag = state[:3]
+    r0, r1, r2, r3, r4, r5, r6, r7, r8, r9, r10, r11, r12, ar, ipc = state[REGISTER_FIELDS]
+    ir, instruction, term, port_0, port_1, interruption, vector, enabled, handling, micro_op = state[18:]
+    registers_repr = "\n\tTICK: {:3} PC: {:3} Z_FLAG: {:3} \n\tr0: {:2}|  r1: {:2}|  r2: {:2}| r3: {:2}| r4: {:2}| r5: {:2}| r6: {:2}| r7: {:2}| r8: {:2}| r9: {:2}| r10: {:2}| r11: {:2}| r12: {:2}| ar: {:2}| ir: {:2}| ipc: {:2}| ".format(
+        str(tick),
+        str(pc),
+        int(zero_flag),
+        *(str(value) for value in (r0, r1, r2, r3, r4, r5, r6, r7, r8, r9, r10, r11, r12, ar, ir, ipc)),
+    )
+
+    ports = "|PORT_0: {} |".format(port_0) + "PORT_1: {}|".format(port_1)
+    inter = "CONTROLLER_INT: {}".format(interruption)
+    if interruption:
+        addr_int_vec = " | INT_VECTOR_ADDR: {} |".format(vector)
+        inter_cu = " INT_ENABLED: {} |".format(enabled)
+        handling_int = " INT_HANDLING: {} |".format(handling)
+        inter = inter + addr_int_vec + inter_cu + handling_int
+
+    return "{} {} | \t[instruction: {} #{}] {} \n \t{} ".format(
+        registers_repr, micro_op, instruction, term, ports, inter
+    )
+
+
+def render_text(entries):
+    """Строки текстового журнала по снимкам тактов и событиям"""
+    for entry in entries:
+        yield entry if isinstance(entry, str) else format_tick(entry)
+
+
+class TraceSink:
+    """Приёмник, который ничего не сохраняет"""
+
+    active: bool = False
+
+    def tick(self, state: tuple) -> None:
+        pass
+
+    def event(self, message: str) -> None:
+        pass
+
+    def finish(self, reason: str | None = None) -> None:
+        pass
+
+
+NullTraceSink = TraceSink
+
+
+class TextTraceSink(TraceSink):
+    """Текстовый журнал через `logging`. Записи приписываются вызывающему коду."""
+
+    @property
+    def active(self) -> bool:
+        return logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    def tick(self, state: tuple) -> None:
+        logging.debug(format_tick(state), stacklevel=2)
+
+    def event(self, message: str) -> None:
+        logging.debug(message, stacklevel=2)
+
+
+class RingBufferTraceSink(TraceSink):
+    """Последние `capacity` тактов и событий в памяти, без форматирования"""
+
+    active: bool = True
+    entries: collections.deque = None
+
+    def __init__(self, capacity: int):
+        self.entries = collections.deque(maxlen=capacity)
+
+    def tick(self, state: tuple) -> None:
+        self.entries.append(state)
+
+    def event(self, message: str) -> None:
+        self.entries.append(message)
+
+
+class FlightRecorder(RingBufferTraceSink):
+    """Бортовой самописец: последние такты хранятся без форматирования и
+    выводятся текстом только при аварийной остановке или по сигналу."""
+
+    stream = None
+
+    def __init__(self, capacity: int, stream=None):
+        super().__init__(capacity)
+        self.stream = stream
+
+    def dump(self, reason: str) -> None:
+        stream = sys.stderr if self.stream is None else self.stream
+        ticks = sum(1 for entry in self.entries if not isinstance(entry, str))
+        print(f"flight recorder: last {ticks} ticks before: {reason}", file=stream)
+        for line in render_text(list(self.entries)):
+            print(line, file=stream)
+        stream.flush()
+
+    def finish(self, reason: str | None = None) -> None:
+        if reason is not None:
+            self.dump(reason)
+
+    def install_signal_handler(self, signum: int | None = None) -> None:
+        """Вывод журнала по сигналу (по умолчанию SIGUSR1, если он есть)"""
+        signum = getattr(signal, "SIGUSR1", None) if signum is None else signum
+        if signum is not None:
+            signal.signal(signum, lambda number, frame: self.dump(f"signal {number}"))
+
+
+class StringTable:
+    """Нумерация строк (опкоды, микрооперации, нечисловые значения регистров)"""
+
+    ids: dict = None
+    on_new = None
+
+    def __init__(self, on_new):
+        self.ids = {}
+        self.on_new = on_new
+
+    def intern(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.ids)
+            self.on_new(string_id, value)
+        return string_id
+
+
+class BinaryTraceSink(TraceSink):
+    """Двоичный журнал: одна запись `TICK_STRUCT` на такт"""
+
+    active: bool = True
+    file = None
+    strings: StringTable = None
+
+    def __init__(self, filename: str):
+        self.file = open(filename, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.strings = StringTable(self.write_string)
+
+    def write_string(self, string_id: int, value: str) -> None:
+        data = value.encode("utf-8")
+        self.file.write(STRING_HEADER.pack(STRING_RECORD, string_id, len(data)) + data)
+
+    def tick(self, state: tuple) -> None:
+        intern = self.strings.intern
+        ir, instruction, micro_op = intern(str(state[18])), intern(str(state[19])), intern(state[27])
+        flags = state[23] | state[25] << 1 | state[26] << 2
+        try:
+            record = TICK_STRUCT.pack(
+                TICK_RECORD, *state[:18], ir, instruction, *state[20:23], flags, state[24], micro_op, 0
+            )
+        except struct.error:
+            record = self.pack_boxed(state, ir, instruction, flags, micro_op)
+        self.file.write(record)
+
+    def pack_boxed(self, state: tuple, ir: int, instruction: int, flags: int, micro_op: int) -> bytes:
+        """Упаковка такта, в котором есть нечисловые или слишком большие значения"""
+        values, mask = list(state), 0
+        for bit, index in enumerate(BOXABLE_FIELDS):
+            value = values[index]
+            if type(value) is not int or not -(1 << 31) <= value < 1 << 31:
+                values[index] = self.strings.intern(str(value))
+                mask |= 1 << bit
+        return TICK_STRUCT.pack(
+            TICK_RECORD, *values[:18], ir, instruction, *values[20:23], flags, values[24], micro_op, mask
+        )
+
+    def event(self, message: str) -> None:
+        data = message.encode("utf-8")
+        self.file.write(EVENT_HEADER.pack(EVENT_RECORD, len(data)) + data)
+
+    def finish(self, reason: str | None = None) -> None:
+        self.file.close()
+
+
+def unpack_tick(fields: tuple, strings: list) -> tuple:
+    """Снимок такта из полей `TICK_STRUCT`"""
+    state = [*fields[1:19], strings[fields[19]], strings[fields[20]], *fields[21:24]]
+    flags, vector, micro_op, mask = fields[24:]
+    state += [bool(flags & 1), vector, bool(flags & 2), bool(flags & 4), strings[micro_op]]
+    for bit, index in enumerate(BOXABLE_FIELDS):
+        if mask & 1 << bit:
+            state[index] = strings[state[index]]
+    return tuple(state)
+
+
+def read_trace(filename: str):
+    """Снимки тактов (кортежи) и события (строки) из двоичного журнала"""
+    with open(filename, "rb") as file:
+        data = file.read()
+    assert data.startswith(TRACE_MAGIC), f"{filename} is not a binary trace"
+    strings, offset = [], len(TRACE_MAGIC)
+    while offset < len(data):
+        kind = data[offset]
+        if kind == TICK_RECORD:
+            yield unpack_tick(TICK_STRUCT.unpack_from(data, offset), strings)
+            offset += TICK_STRUCT.size
+        elif kind == STRING_RECORD:
+            _, _, length = STRING_HEADER.unpack_from(data, offset)
+            offset += STRING_HEADER.size + length
+            strings.append(data[offset - length : offset].decode("utf-8"))
+        else:
+            _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size + length
+            yield data[offset - length : offset].decode("utf-8")
+
+
+DELTA_MAGIC = b"RMDELTA\x01"
+KEYFRAME_RECORD = 4
+DELTA_RECORD = 5
+INDEX_FOOTER = struct.Struct("<Q")
+KEYFRAME_INTERVAL = 1024
+BOOL_FIELDS = (23, 25, 26)
+FLUSH_SIZE = 1 << 16
+
+
+def write_varint(buffer: bytearray, value: int) -> None:
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varint(data: bytes, offset: int) -> tuple:
+    """
+    >>> buffer = bytearray()
+    >>> write_varint(buffer, 300)
+    >>> read_varint(bytes(buffer), 0)
+    (300, 2)
+    """
+    result = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+class DeltaTraceSink(TraceSink):
+    """Сжатый журнал: в записи такта только поля, изменившиеся с прошлого такта.
+
+    Каждые `keyframe_interval` тактов пишется полный снимок (опорный кадр).
+    Таблица строк и индекс опорных кадров лежат в конце файла, последние
+    8 байт -- смещение этого оглавления.
+    """
+
+    active: bool = True
+    file = None
+    buffer: bytearray = None
+    written: int = None
+    strings: StringTable = None
+    previous: tuple = None
+    keyframes: list = None
+    keyframe_interval: int = None
+    since_keyframe: int = None
+
+    def __init__(self, filename: str, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.file = open(filename, "wb")
+        self.buffer = bytearray(DELTA_MAGIC)
+        self.written = 0
+        self.strings = StringTable(lambda string_id, value: None)
+        self.keyframes = []
+        self.keyframe_interval = keyframe_interval
+        self.since_keyframe = 0
+
+    def encode(self, value) -> int:
+        """Значение поля: чётное -- число в zigzag, нечётное -- номер строки"""
+        if isinstance(value, int):
+            return (value << 2) if value >= 0 else (~value << 2 | 2)
+        return self.strings.intern(str(value)) << 1 | 1
+
+    def tick(self, state: tuple) -> None:
+        previous = self.previous
+        if previous is None or self.since_keyframe >= self.keyframe_interval:
+            self.write_keyframe(state)
+        else:
+            mask, values = 0, []
+            if state[0] != previous[0] + 1:
+                mask, values = 1, [self.encode(state[0])]
+            for index in range(1, len(state)):
+                if state[index] != previous[index]:
+                    mask |= 1 << index
+                    values.append(self.encode(state[index]))
+            self.write_record(DELTA_RECORD, [mask, *values])
+            self.since_keyframe += 1
+        self.previous = state
+
+    def write_keyframe(self, state: tuple) -> None:
+        values = [self.encode(value) for value in state]
+        self.keyframes.append((state[0], self.written + len(self.buffer)))
+        self.write_record(KEYFRAME_RECORD, values)
+        self.since_keyframe = 0
+
+    def write_record(self, kind: int, values: list) -> None:
+        self.buffer.append(kind)
+        for value in values:
+            write_varint(self.buffer, value)
+        if len(self.buffer) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.file.write(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = bytearray()
+
+    def event(self, message: str) -> None:
+        data = message.encode("utf-8")
+        self.buffer += EVENT_HEADER.pack(EVENT_RECORD, len(data)) + data
+
+    def finish(self, reason: str | None = None) -> None:
+        index_offset = self.written + len(self.buffer)
+        write_varint(self.buffer, len(self.strings.ids))
+        for value in self.strings.ids:
+            data = value.encode("utf-8")
+            write_varint(self.buffer, len(data))
+            self.buffer += data
+        write_varint(self.buffer, len(self.keyframes))
+        for tick, offset in self.keyframes:
+            write_varint(self.buffer, tick)
+            write_varint(self.buffer, offset)
+        self.buffer += INDEX_FOOTER.pack(index_offset)
+        self.flush()
+        self.file.close()
+
+
+class DeltaTraceReader:
+    """Чтение сжатого журнала с переходом к произвольному такту"""
+
+    data: bytes = None
+    strings: list = None
+    keyframes: list = None
+    end: int = None
+
+    def __init__(self, filename: str):
+        with open(filename, "rb") as file:
+            self.data = file.read()
+        assert self.data.startswith(DELTA_MAGIC), f"{filename} is not a delta trace"
+        (self.end,) = INDEX_FOOTER.unpack_from(self.data, len(self.data) - INDEX_FOOTER.size)
+        self.read_index()
+
+    def read_index(self) -> None:
+        count, offset = read_varint(self.data, self.end)
+        self.strings = []
+        for _ in range(count):
+            length, offset = read_varint(self.data, offset)
+            self.strings.append(self.data[offset : offset + length].decode("utf-8"))
+            offset += length
+        count, offset = read_varint(self.data, offset)
+        self.keyframes = []
+        for _ in range(count):
+            tick, offset = read_varint(self.data, offset)
+            position, offset = read_varint(self.data, offset)
+            self.keyframes.append((tick, position))
+
+    def decode(self, index: int, value: int):
+        if value & 1:
+            return self.strings[value >> 1]
+        number = ~(value >> 2) if value & 2 else value >> 2
+        return bool(number) if index in BOOL_FIELDS else number
+
+    def entries(self, start_tick: int = 0):
+        """Снимки тактов начиная с `start_tick` и события между ними"""
+        keyframe = bisect.bisect_right(self.keyframes, (start_tick, self.end)) - 1
+        offset = self.keyframes[max(keyframe, 0)][1] if self.keyframes else self.end
+        state = None
+        while offset < self.end:
+            kind = self.data[offset]
+            if kind == EVENT_RECORD:
+                _, length = EVENT_HEADER.unpack_from(self.data, offset)
+                offset += EVENT_HEADER.size + length
+                entry = self.data[offset - length : offset].decode("utf-8")
+            else:
+                state, offset = self.read_state(kind, offset + 1, state)
+                entry = state
+            if state is not None and state[0] >= start_tick:
+                yield entry
+
+    __iter__ = entries
+
+    def read_state(self, kind: int, offset: int, previous: tuple) -> tuple:
+        if kind == KEYFRAME_RECORD:
+            state = []
+            for index in range(len(TRACE_FIELDS)):
+                value, offset = read_varint(self.data, offset)
+                state.append(self.decode(index, value))
+            return tuple(state), offset
+
+        mask, offset = read_varint(self.data, offset)
+        state = list(previous)
+        state[0] += 1
+        for index in range(len(TRACE_FIELDS)):
+            if mask >> index & 1:
+                value, offset = read_varint(self.data, offset)
+                state[index] = self.decode(index, value)
+        return tuple(state), offset
+
+    def state_at(self, tick: int) -> tuple:
+        """Снимок состояния на такте `tick`"""
+        for entry in self.entries(tick):
+            if not isinstance(entry, str):
+                return entry
+        raise TickNotInTraceError(tick)
+
+
+TRACE_SINKS = {".trace": BinaryTraceSink, ".dtrace": DeltaTraceSink}
+
+
+def open_trace_sink(filename: str) -> TraceSink:
+    """Приёмник по расширению файла: `.dtrace` -- сжатый, иначе полный"""
+    return TRACE_SINKS.get(Path(filename).suffix, BinaryTraceSink)(filename)
+
+
+def read_any_trace(filename: str, start_tick: int = 0):
+    with open(filename, "rb") as file:
+        magic = file.read(len(DELTA_MAGIC))
+    if magic == DELTA_MAGIC:
+        return DeltaTraceReader(filename).entries(start_tick)
+    return (entry for entry in read_trace(filename) if isinstance(entry, str) or entry[0] >= start_tick)
+
+
+def main(trace_file: str, start_tick: str = "0"):
+    for line in render_text(read_any_trace(trace_file, int(start_tick))):
+        print(line)
+
+
+class TickNotInTraceError(IndexError):
+    def __init__(self, tick):
+        super().__init__(f"No tick {tick} in trace")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) in (2, 3), "Wrong arguments: tracer.py <trace_file> [<start_tick>]"
+    main(*sys.argv[1:])
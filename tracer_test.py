@@ -0,0 +1,95 @@
+"""Тесты приёмников журнала тактов."""
+
+import io
+import logging
+
+import machine
+import pytest
+import tracer
+import translator
+from isa import Opcode
+
+ECHO = """
+section .text:
+    ei
+    .loop:
+        jmp .loop
+    .end:
+        halt
+.int1:
+    in r1, 0
+    move r2, #48
+    cmp r1, r2
+    jz .end
+    out r1, 1
+    iret
+"""
+ECHO_INPUT = [(0, "h"), (40, "i"), (80, "0")]
+
+
+def test_binary_trace_renders_text_log(tmp_path, caplog):
+    code = translator.translate(ECHO)
+    caplog.set_level(logging.DEBUG)
+    machine.simulation(code, list(ECHO_INPUT))
+    live = [record.getMessage() for record in caplog.records]
+
+    trace_file = str(tmp_path / "echo.trace")
+    machine.simulation(code, list(ECHO_INPUT), tracer.BinaryTraceSink(trace_file))
+    assert list(tracer.render_text(tracer.read_trace(trace_file))) == live
+
+
+def test_boxed_values_survive_round_trip(tmp_path):
+    state = list(range(28))
+    state[16] = {"int1": 4}
+    state[18:20] = [Opcode.LOAD, "load"]
+    state[23:28] = [True, 2**40, False, True, "MEM[PC] -> IR"]
+    sink = tracer.BinaryTraceSink(str(tmp_path / "boxed.trace"))
+    sink.tick(tuple(state))
+    sink.finish()
+
+    (decoded,) = tracer.read_trace(str(tmp_path / "boxed.trace"))
+    assert tracer.format_tick(decoded) == tracer.format_tick(tuple(state))
+
+
+def test_ring_buffer_keeps_last_ticks():
+    sink = tracer.RingBufferTraceSink(5)
+    _, _, ticks = machine.simulation(translator.translate(ECHO), list(ECHO_INPUT), sink)
+    assert len(sink.entries) == 5
+    assert sink.entries[-1][0] == ticks
+
+
+def test_delta_trace_renders_text_log_and_seeks(tmp_path):
+    code = translator.translate(ECHO)
+    full = tracer.RingBufferTraceSink(10000)
+    machine.simulation(code, list(ECHO_INPUT), full)
+
+    trace_file = str(tmp_path / "echo.dtrace")
+    machine.simulation(code, list(ECHO_INPUT), tracer.DeltaTraceSink(trace_file, keyframe_interval=16))
+    reader = tracer.DeltaTraceReader(trace_file)
+    assert list(tracer.render_text(reader)) == list(tracer.render_text(full.entries))
+
+    ticks = [entry for entry in full.entries if not isinstance(entry, str)]
+    assert len(reader.keyframes) > 1
+    assert tracer.format_tick(reader.state_at(50)) == tracer.format_tick(ticks[49])
+
+
+def test_flight_recorder_dumps_on_abnormal_stop():
+    code = translator.translate("section .data:\n    ptr: 2000000\nsection .text:\n    load r0, (ptr)\n    halt")
+    stream = io.StringIO()
+    with pytest.raises(AssertionError):
+        machine.simulation(code, [], tracer.FlightRecorder(3, stream))
+    dump = stream.getvalue()
+    assert dump.startswith("flight recorder: last 3 ticks before: AssertionError: Memory doesn't have cell")
+    assert "PC: 2000000" in dump
+    assert dump.count("TICK:") == 3
+
+
+def test_flight_recorder_is_silent_on_halt():
+    stream = io.StringIO()
+    machine.simulation(translator.translate(ECHO), list(ECHO_INPUT), tracer.FlightRecorder(3, stream))
+    assert stream.getvalue() == ""
+
+
+def test_trace_file_and_flight_recorder_are_exclusive(tmp_path):
+    with pytest.raises(machine.TraceSinkConflictError):
+        machine.create_trace_sink(str(tmp_path / "out.trace"), 100)
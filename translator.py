@@ -1,4 +1,5 @@
 #!/usr/bin/python3
+import re
 import sys
 
 from isa import Opcode, Term, write_code
@@ -43,7 +44,13 @@ def is_data_section_start(line: str) -> bool:
 
 
 def is_data_section_end(in_data_section: bool, line: str) -> bool:
-    return in_data_section and line.startswith(".")
+    """Секцию данных заканчивает метка секции или кода (`.метка:`), в том числе обработчик `int N:`.
+
+    Строка `int5: 3` -- ячейка данных с именем `int5`, а не обработчик: после двоеточия есть значение.
+    """
+    if not in_data_section:
+        return False
+    return line.startswith(".") or (line.endswith(":") and is_vector_label(line[:-1].strip()))
 
 
 def parse_line(line: str) -> tuple:
@@ -130,9 +137,11 @@ def process_line(pc: int, line: str, labels: dict) -> dict:
 def process_opcode(pc: int, op: str, line_term: list, labels: dict) -> dict:
     if op in ["load", "store"]:
         return process_load_store(op, line_term, labels, pc)
+    if op == "cas":
+        return process_cas(op, line_term, labels, pc)
     if op in ["add", "sub", "mod", "inc", "cmp"]:
         return process_arithmetic(op, line_term, pc)
-    if op in ["di", "ei", "in", "out", "iret", "halt"]:
+    if op in ["di", "ei", "in", "out", "iret", "halt", "wait"]:
         return process_single_op(op, line_term, pc)
     if op in ["jz", "jnz", "jmp"]:
         return process_jump(op, line_term, labels, pc)
@@ -150,6 +159,13 @@ def process_load_store(op: str, line_term: list, labels: dict, pc: int) -> dict:
     return {"opcode": op, "reg": num_first_reg, "op": addr, "addrType": 0, "term": Term(pc, line_term[2])}
 
 
+def process_cas(op: str, line_term: list, labels: dict, pc: int) -> dict:
+    """`cas rA, rB, addr`: ожидаемое значение в `reg`, новое -- в `op1`, адрес как у `load`"""
+    instr = process_load_store(op, [op, line_term[1], line_term[3]], labels, pc)
+    instr["op1"] = int(line_term[2][1:-1])
+    return instr
+
+
 def process_arithmetic(op: str, line_term: list, pc: int) -> dict:
     if len(line_term) == 2:
         num_first_reg = int(line_term[1][1:])
@@ -198,11 +214,41 @@ def process_data(pc: int, op: str, labels: dict) -> dict:
     return {"data": labels.get(op), "term": Term(pc, op)}
 
 
+INTERRUPT_LABEL = re.compile(r"(?:\.int|int\s*)(\d+)")
+HART_LABEL = re.compile(r"\.hart(\d+)")
+
+
+def is_vector_label(label: str) -> bool:
+    """Метка попадает в вектор: обработчик прерывания или точка входа ядра"""
+    return INTERRUPT_LABEL.fullmatch(label) is not None or HART_LABEL.fullmatch(label) is not None
+
+
+def is_instruction_cell(code: list, address: int) -> bool:
+    return address < len(code) and "opcode" in code[address]
+
+
+def interrupt_vector(labels: dict, code: list) -> dict:
+    """
+    Вектор прерываний по меткам обработчиков `.intN:` (или `int N:`) и точки входа
+    ядер `.hartN:` для многоядерной модели. У `int1` без обработчика -- `-`.
+    Метки ячеек данных (`int5: 3`) в вектор не попадают.
+    """
+    handlers, harts = {}, {}
+    for label, address in labels.items():
+        if not is_instruction_cell(code, address):
+            continue
+        if match := INTERRUPT_LABEL.fullmatch(label):
+            handlers[int(match.group(1))] = address
+        elif match := HART_LABEL.fullmatch(label):
+            harts[int(match.group(1))] = address
+    vector = {"int1": handlers.pop(1, "-")}
+    vector.update((f"int{line}", handlers[line]) for line in sorted(handlers))
+    vector.update((f"hart{number}", harts[number]) for number in sorted(harts))
+    return vector
+
+
 def append_interrupt_label(code: list, labels: dict) -> None:
-    if ".int1" in labels:
-        code.append({"int1": labels.get(".int1")})
-    else:
-        code.append({"int1": "-"})
+    code.append(interrupt_vector(labels, code))
 
 
 def translate(text):
@@ -212,6 +258,91 @@ def translate(text):
     return translate_to_machine_word(labels, clear_lines)
 
 
+# Меняется вместе с машинным кодом транслятора: объекты прежних версий в кэше сборки не используются
+OBJECT_FORMAT_VERSION = 3
+SECTION_LABELS = (".data", ".text")
+IDENTIFIER = re.compile(r"[A-Za-z_.][\w.]*")
+
+
+class SymbolTable(dict):
+    """Метки модуля. Ссылки на неизвестные метки запоминаются как импорт
+    и временно получают адрес 0 -- его заполнит компоновщик."""
+
+    imports: set = None
+
+    def __init__(self, labels: dict):
+        super().__init__(labels)
+        self.imports = set()
+
+    def get(self, key, default=None):
+        if key in self or not IDENTIFIER.fullmatch(key):
+            return super().get(key, default)
+        self.imports.add(key)
+        return 0
+
+
+def extract_globals(lines: list) -> list:
+    """Убирает из списка строк директивы `global <метка>` и возвращает экспортируемые имена"""
+    exports = [line.split()[1] for line in lines if line.startswith("global ")]
+    lines[:] = [line for line in lines if not line.startswith("global ")]
+    return exports
+
+
+def split_sections(labels: dict, size: int) -> list:
+    """Секция (.text или .data) для каждой ячейки модуля"""
+    boundaries = sorted((labels[name], name) for name in SECTION_LABELS if name in labels)
+    sections, current = [], ".text"
+    for index in range(size):
+        while boundaries and boundaries[0][0] == index:
+            current = boundaries.pop(0)[1]
+        sections.append(current)
+    return sections
+
+
+def cell_relocation(cell: dict, labels: dict, imports: set) -> dict:
+    """Запись о перемещении для ячейки, ссылающейся на метку"""
+    symbol = cell.get("term", Term(0, ""))[1]
+    if symbol in labels or symbol in imports:
+        return {"field": "op" if "opcode" in cell else "data", "symbol": symbol}
+    return None
+
+
+def translate_object(text: str) -> dict:
+    """
+    Транслирует модуль в перемещаемый объектный файл. Ячейки разложены по секциям
+    .text/.data с адресами относительно начала секции, ссылки на метки вынесены в
+    таблицу перемещений, а неизвестные метки -- в список импорта.
+    """
+    lines = remove_comments_and_blank_lines(text)[1:]
+    exports = extract_globals(lines)
+    process_data_section_in_list_inplace(lines)
+    labels = process_labels(lines)
+    symbols = SymbolTable(labels)
+    sections = {name: [] for name in SECTION_LABELS}
+    relocations, positions = [], []
+
+    for index, section_name in enumerate(split_sections(labels, len(lines))):
+        section = sections[section_name]
+        positions.append([section_name, len(section)])
+        cell = process_line(index, lines[index], symbols)
+        relocation = cell_relocation(cell, labels, symbols.imports)
+        if relocation is not None:
+            relocations.append({"section": section_name, "index": len(section), **relocation})
+        if "term" in cell:
+            cell["term"] = Term(len(section), cell["term"][1])
+        section.append(cell)
+    positions.append([".text", len(sections[".text"])])
+
+    return {
+        "format": OBJECT_FORMAT_VERSION,
+        "sections": sections,
+        "symbols": {label: positions[index] for label, index in labels.items()},
+        "exports": exports,
+        "imports": sorted(symbols.imports),
+        "relocations": relocations,
+    }
+
+
 def main(source, target):
     """Функция запуска транслятора. Параметры -- исходный и целевой файлы."""
     with open(source, encoding="utf-8") as f:
@@ -0,0 +1,46 @@
+"""Тесты транслятора."""
+
+import machine
+import translator
+
+HANDLER_AFTER_DATA = """
+section .data:
+    letter: 65
+int 2:
+    load r1, letter
+    out r1, 1
+    halt
+section .text:
+    move r0, #5
+    out r0, 2
+    ei
+    wait
+    halt
+"""
+
+
+def test_interrupt_label_ends_data_section():
+    code = translator.translate(HANDLER_AFTER_DATA)
+    handler = code[-1]["int2"]
+    assert code[handler]["opcode"] == "load"
+    output, _, _ = machine.simulation(code, [])
+    assert "".join(output) == "A"
+
+
+DATA_NAMED_LIKE_HANDLER = """
+section .data:
+    int5: 3
+    x: 7
+section .text:
+    load r0, x
+    out r0, 1
+    halt
+"""
+
+
+def test_data_cell_named_like_handler_stays_in_data_section():
+    code = translator.translate(DATA_NAMED_LIKE_HANDLER)
+    assert code[1]["data"] == 3
+    assert code[2]["data"] == 7
+    assert code[3]["op"] == 2
+    assert "int5" not in code[-1]